@@ -2,28 +2,14 @@
 import streamlit as st
 import pandas as pd
 from io import BytesIO
-from openpyxl import load_workbook, Workbook
+from bom_io import ReferenceIndex, load_bom, sheet_rows
+from bom_sheet import rows_workbook
 import difflib
 
 st.set_page_config(layout="wide")
 st.title("🔄 BOM Supplier Mapping (OLD → NEW)")
 
 # ---------- helpers ----------
-def detect_header_row_ws(ws, look_for=('mpn','manufacturer','coreel','part number')):
-    """
-    Find the header row index (1-based) by scanning first 30 rows for a candidate word.
-    Returns header_row (int). Defaults to 1 if not found.
-    """
-    max_check = min(30, ws.max_row)
-    for r in range(1, max_check+1):
-        rowvals = []
-        for c in range(1, min(300, ws.max_column)+1):
-            v = ws.cell(row=r, column=c).value
-            rowvals.append(str(v).strip().lower() if v else "")
-        if any(any(x in cell for cell in rowvals) for x in look_for):
-            return r
-    return 1
-
 def find_best_col_name(logical_name, available_cols):
     """
     Return the actual column name from available_cols that best matches logical_name (case-insensitive).
@@ -61,27 +47,15 @@ if not old_file or not new_file:
 try:
     old_bytes = old_file.read()
     new_bytes = new_file.read()
-    wb_old = load_workbook(filename=BytesIO(old_bytes), data_only=True)
-    wb_new = load_workbook(filename=BytesIO(new_bytes), data_only=False)
-    ws_old = wb_old.active
-    ws_new = wb_new.active
+    # each BOM is parsed once: header row, DataFrame and worksheet all come from that parse
+    wb_old, ws_old, hdr_old, old_headers, old_df = load_bom(old_bytes)
+    wb_new, ws_new, hdr_new, new_headers, new_df = load_bom(new_bytes, keep_formulas=True)  # keep formulas
 except Exception as e:
     st.error(f"Error loading workbooks: {e}")
     st.stop()
 
-# detect header rows
-hdr_old = detect_header_row_ws(ws_old)
-hdr_new = detect_header_row_ws(ws_new)
 st.info(f"Detected header row → OLD: {hdr_old}, NEW: {hdr_new}")
 
-# Read pandas DataFrames
-old_df = pd.read_excel(BytesIO(old_bytes), header=hdr_old-1)
-new_df = pd.read_excel(BytesIO(new_bytes), header=hdr_new-1)
-
-# Normalize column lists
-old_df.columns = [str(c).strip() for c in old_df.columns]
-new_df.columns = [str(c).strip() for c in new_df.columns]
-
 # Detect MPN columns
 mpn_candidates = ["mpn", "manufacturer part number", "part number", "mfr p/n", "coreel p/n"]
 def detect_mpn_col_from_list(cols):
@@ -118,33 +92,16 @@ for logical in TRANSFER_COLS_LOGICAL:
     else:
         actual_old_col_for[logical] = actual
 
-mapping = {}
-for _, r in old_df.iterrows():
-    key = r.get(old_mpn_col, None)
-    if pd.isna(key):
-        continue
-    key = str(key).strip()
-    vals = {}
-    for logical in TRANSFER_COLS_LOGICAL:
-        actual_col = actual_old_col_for[logical]
-        vals[logical] = r.get(actual_col, None) if actual_col in old_df.columns else None
-    if key not in mapping:
-        mapping[key] = vals
-    if alt_col:
-        alt_val = r.get(alt_col, None)
-        if pd.notna(alt_val):
-            alt_val = str(alt_val).strip()
-            if alt_val and alt_val not in mapping:
-                mapping[alt_val] = vals
-
-st.write(f"Loaded {len(mapping)} reference MPN rows from OLD BOM")
-
-# Build header map for NEW
+# one row of transfer values per MPN / Alternate key, built from whole OLD columns
+reference = ReferenceIndex(old_df, old_mpn_col, alt_col, actual_old_col_for)
+
+st.write(f"Loaded {len(reference)} reference MPN rows from OLD BOM")
+
+# Build header map for NEW (header names: a two-line header's combined labels)
 header_map_new = {}
-for c in range(1, ws_new.max_column + 1):
-    val = ws_new.cell(row=hdr_new, column=c).value
-    if val is not None:
-        header_map_new[str(val).strip()] = c
+for c, val in enumerate(new_headers, start=1):
+    if val:
+        header_map_new[val] = c
 norm_header_map_new = {str(k).strip(): v for k, v in header_map_new.items()}
 
 # Prepare final header order → transfer columns at CR (col 96)
@@ -158,49 +115,45 @@ for i, col in enumerate(TRANSFER_COLS_LOGICAL):
     if col not in final_headers:
         final_headers.insert(insert_at, col)
 
-# Build output workbook
-wb_out = Workbook()
-ws_out = wb_out.active
+# Read the NEW data rows once (value or formula per cell, None when blank)
+max_row_new = ws_new.max_row
+new_rows = sheet_rows(ws_new, hdr_new + 1, max_row_new, ws_new.max_column)
+
+# Look up every NEW row's MPN in the reference index at once (None → no OLD row)
+mpn_col_idx = norm_header_map_new.get(new_mpn_col)
+matches = reference.lookup([vals[mpn_col_idx - 1] if mpn_col_idx else None for vals in new_rows])
+
+# Per output column: the NEW column (0-based) its value/formula is copied from, None when blank
+# (padding, or not in the NEW sheet); transfer columns are filled from the mapped values instead
+copy_from = [
+    None if header in TRANSFER_COLS_LOGICAL or header.startswith("__pad") or not norm_header_map_new.get(header)
+    else norm_header_map_new[header] - 1
+    for header in final_headers
+]
+transfer_at = [(c, header) for c, header in enumerate(final_headers) if header in TRANSFER_COLS_LOGICAL]
+remarks_idx = norm_header_map_new.get("Remarks")
 
-# Write headers
-for col_i, header in enumerate(final_headers, start=1):
-    ws_out.cell(row=hdr_new, column=col_i, value=header if not header.startswith("__pad") else "")
 
-# Write data rows
-max_row_new = ws_new.max_row
-for r in range(hdr_new + 1, max_row_new + 1):
-    orig_values = {}
-    for hdr_name, col_idx in norm_header_map_new.items():
-        orig_values[hdr_name] = ws_new.cell(row=r, column=col_idx).value
-
-    mpn_val = None
-    mpn_col_idx = norm_header_map_new.get(new_mpn_col)
-    if mpn_col_idx:
-        mpn_val = ws_new.cell(row=r, column=mpn_col_idx).value
-    mpn_key = str(mpn_val).strip() if mpn_val is not None else ""
-    mapped_vals = mapping.get(mpn_key)
-
-    for c_idx, header in enumerate(final_headers, start=1):
-        if header in TRANSFER_COLS_LOGICAL:
+def output_rows():
+    yield [header if not header.startswith("__pad") else "" for header in final_headers]
+    for values, mapped_vals in zip(new_rows, matches):
+        row = [values[j] if j is not None else None for j in copy_from]
+        for c, header in transfer_at:
             v = mapped_vals.get(header) if mapped_vals else None
             if header.lower() == "remarks":
-                orig_rem = orig_values.get("Remarks")
+                orig_rem = values[remarks_idx - 1] if remarks_idx else None
                 if mapped_vals and mapped_vals.get("Remarks"):
                     v = mapped_vals.get("Remarks")
                 elif not mapped_vals and (orig_rem is None or str(orig_rem).strip() == ""):
                     v = "New Part"
                 elif not mapped_vals and orig_rem:
                     v = orig_rem
-            ws_out.cell(row=r, column=c_idx, value=v)
-        elif header.startswith("__pad"):
-            ws_out.cell(row=r, column=c_idx, value=None)
-        else:
-            orig_col_idx = norm_header_map_new.get(header)
-            if orig_col_idx:
-                orig_cell = ws_new.cell(row=r, column=orig_col_idx)
-                ws_out.cell(row=r, column=c_idx, value=orig_cell.value)
-            else:
-                ws_out.cell(row=r, column=c_idx, value=None)
+            row[c] = v
+        yield row
+
+
+# Build output workbook: headers at the NEW header row, then the data rows, streamed row by row
+wb_out = rows_workbook(output_rows(), first_row=hdr_new)
 
 # Save to buffer
 buffer = BytesIO()
@@ -217,7 +170,7 @@ st.download_button(
 
 # Preview
 try:
-    df_preview = pd.read_excel(BytesIO(buffer.getvalue()), header=hdr_new-1)
+    df_preview = pd.read_excel(BytesIO(buffer.getvalue()), header=hdr_new-1, nrows=40)  # only the rows shown
     st.subheader("Preview (first 40 rows)")
     st.dataframe(df_preview.head(40))
 except Exception:
@@ -1,25 +1,14 @@
 # bom_map_app.py
 import streamlit as st
-import pandas as pd
 from io import BytesIO
-from openpyxl import load_workbook
+from bom_io import ReferenceIndex, load_bom
+from bom_sheet import insert_columns
 import difflib
 
 st.set_page_config(layout="wide")
 st.title("🔄 BOM Supplier Mapping (OLD → NEW)")
 
 # ---------- helpers ----------
-def detect_header_row_ws(ws, look_for=('mpn','manufacturer','coreel','part number')):
-    max_check = min(30, ws.max_row)
-    for r in range(1, max_check+1):
-        rowvals = []
-        for c in range(1, min(300, ws.max_column)+1):
-            v = ws.cell(row=r, column=c).value
-            rowvals.append(str(v).strip().lower() if v else "")
-        if any(any(x in cell for cell in rowvals) for x in look_for):
-            return r
-    return 1
-
 def find_best_col_name(logical_name, available_cols):
     low_map = {str(c).strip().lower(): c for c in available_cols}
     key = logical_name.strip().lower()
@@ -51,23 +40,15 @@ if not old_file or not new_file:
 try:
     old_bytes = old_file.read()
     new_bytes = new_file.read()
-    wb_old = load_workbook(filename=BytesIO(old_bytes), data_only=True)
-    wb_new = load_workbook(filename=BytesIO(new_bytes), data_only=False)  # keep formulas
-    ws_old = wb_old.active
-    ws_new = wb_new.active
+    # each BOM is parsed once: header row, DataFrame and worksheet all come from that parse
+    wb_old, ws_old, hdr_old, old_headers, old_df = load_bom(old_bytes)
+    wb_new, ws_new, hdr_new, new_headers, new_df = load_bom(new_bytes, keep_formulas=True)  # keep formulas
 except Exception as e:
     st.error(f"Error loading workbooks: {e}")
     st.stop()
 
-hdr_old = detect_header_row_ws(ws_old)
-hdr_new = detect_header_row_ws(ws_new)
 st.info(f"Detected header row → OLD: {hdr_old}, NEW: {hdr_new}")
 
-old_df = pd.read_excel(BytesIO(old_bytes), header=hdr_old-1)
-new_df = pd.read_excel(BytesIO(new_bytes), header=hdr_new-1)
-old_df.columns = [str(c).strip() for c in old_df.columns]
-new_df.columns = [str(c).strip() for c in new_df.columns]
-
 # detect MPN column
 mpn_candidates = ["mpn", "manufacturer part number", "part number", "mfr p/n", "coreel p/n"]
 def detect_mpn_col_from_list(cols):
@@ -103,37 +84,23 @@ for logical in TRANSFER_COLS_LOGICAL:
     else:
         actual_old_col_for[logical] = actual
 
-mapping = {}
-for _, r in old_df.iterrows():
-    key = r.get(old_mpn_col, None)
-    if pd.isna(key):
-        continue
-    key = str(key).strip()
-    vals = {}
-    for logical in TRANSFER_COLS_LOGICAL:
-        actual_col = actual_old_col_for[logical]
-        vals[logical] = r.get(actual_col, None) if actual_col in old_df.columns else None
-    if key not in mapping:
-        mapping[key] = vals
-    if alt_col:
-        alt_val = r.get(alt_col, None)
-        if pd.notna(alt_val):
-            alt_val = str(alt_val).strip()
-            if alt_val and alt_val not in mapping:
-                mapping[alt_val] = vals
-
-st.write(f"Loaded {len(mapping)} reference MPN rows from OLD BOM")
+# one row of transfer values per MPN / Alternate key, built from whole OLD columns
+reference = ReferenceIndex(old_df, old_mpn_col, alt_col, actual_old_col_for)
+
+st.write(f"Loaded {len(reference)} reference MPN rows from OLD BOM")
 
 # ---------- Insert new supplier columns at CR onwards ----------
 target_start_col = 96  # CR
+# one shift for all transfer columns; formulas, merged ranges etc. follow the moved cells
+insert_columns(ws_new, target_start_col, len(TRANSFER_COLS_LOGICAL))
 for i, col in enumerate(TRANSFER_COLS_LOGICAL):
-    insert_at = target_start_col + i
-    ws_new.insert_cols(insert_at)
-    ws_new.cell(row=hdr_new, column=insert_at, value=col)
+    ws_new.cell(row=hdr_new, column=target_start_col + i, value=col)
 
 # Fill data rows
 max_row_new = ws_new.max_row
-new_headers = [c.value for c in ws_new[hdr_new]]
+# header names (a two-line header's combined labels) with the transfer columns inserted
+new_headers = new_headers + [""] * (target_start_col - 1 - len(new_headers))
+new_headers[target_start_col - 1:target_start_col - 1] = TRANSFER_COLS_LOGICAL
 
 try:
     mpn_col_idx = new_headers.index(new_mpn_col) + 1
@@ -141,10 +108,11 @@ except ValueError:
     st.error("❌ Could not find MPN column in NEW BOM after insert.")
     st.stop()
 
+# Look up every NEW row's MPN in the reference index at once (None → no OLD row)
+matches = reference.lookup([ws_new.cell(row=r, column=mpn_col_idx).value for r in range(hdr_new + 1, max_row_new + 1)])
+
 for r in range(hdr_new + 1, max_row_new + 1):
-    mpn_val = ws_new.cell(row=r, column=mpn_col_idx).value
-    mpn_key = str(mpn_val).strip() if mpn_val is not None else ""
-    mapped_vals = mapping.get(mpn_key)
+    mapped_vals = matches[r - hdr_new - 1]
 
     for i, col in enumerate(TRANSFER_COLS_LOGICAL):
         c_idx = target_start_col + i
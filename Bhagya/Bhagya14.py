@@ -1,25 +1,14 @@
 # bom_map_app.py
 import streamlit as st
-import pandas as pd
 from io import BytesIO
-from openpyxl import load_workbook
+from bom_io import ReferenceIndex, load_bom, sheet_rows
+from bom_sheet import rows_workbook
 import difflib
 
 st.set_page_config(layout="wide")
 st.title("🔄 BOM Supplier Mapping (OLD → NEW)")
 
 # ---------- helpers ----------
-def detect_header_row_ws(ws, look_for=('mpn','manufacturer','coreel','part number')):
-    max_check = min(30, ws.max_row)
-    for r in range(1, max_check+1):
-        rowvals = []
-        for c in range(1, min(300, ws.max_column)+1):
-            v = ws.cell(row=r, column=c).value
-            rowvals.append(str(v).strip().lower() if v else "")
-        if any(any(x in cell for cell in rowvals) for x in look_for):
-            return r
-    return 1
-
 def find_best_col_name(logical_name, available_cols):
     low_map = {str(c).strip().lower(): c for c in available_cols}
     key = logical_name.strip().lower()
@@ -51,23 +40,15 @@ if not old_file or not new_file:
 try:
     old_bytes = old_file.read()
     new_bytes = new_file.read()
-    wb_old = load_workbook(filename=BytesIO(old_bytes), data_only=True)
-    wb_new = load_workbook(filename=BytesIO(new_bytes), data_only=False)  # keep formulas
-    ws_old = wb_old.active
-    ws_new = wb_new.active
+    # each BOM is parsed once: header row, DataFrame and worksheet all come from that parse
+    wb_old, ws_old, hdr_old, old_headers, old_df = load_bom(old_bytes)
+    wb_new, ws_new, hdr_new, new_headers, new_df = load_bom(new_bytes, keep_formulas=True)  # keep formulas
 except Exception as e:
     st.error(f"Error loading workbooks: {e}")
     st.stop()
 
-hdr_old = detect_header_row_ws(ws_old)
-hdr_new = detect_header_row_ws(ws_new)
 st.info(f"Detected header row → OLD: {hdr_old}, NEW: {hdr_new}")
 
-old_df = pd.read_excel(BytesIO(old_bytes), header=hdr_old-1)
-new_df = pd.read_excel(BytesIO(new_bytes), header=hdr_new-1)
-old_df.columns = [str(c).strip() for c in old_df.columns]
-new_df.columns = [str(c).strip() for c in new_df.columns]
-
 # detect MPN column
 mpn_candidates = ["mpn", "manufacturer part number", "part number", "mfr p/n", "coreel p/n"]
 def detect_mpn_col_from_list(cols):
@@ -103,42 +84,27 @@ for logical in TRANSFER_COLS_LOGICAL:
     else:
         actual_old_col_for[logical] = actual
 
-mapping = {}
-for _, r in old_df.iterrows():
-    key = r.get(old_mpn_col, None)
-    if pd.isna(key):
-        continue
-    key = str(key).strip()
-    vals = {}
-    for logical in TRANSFER_COLS_LOGICAL:
-        actual_col = actual_old_col_for[logical]
-        vals[logical] = r.get(actual_col, None) if actual_col in old_df.columns else None
-    if key not in mapping:
-        mapping[key] = vals
-    if alt_col:
-        alt_val = r.get(alt_col, None)
-        if pd.notna(alt_val):
-            alt_val = str(alt_val).strip()
-            if alt_val and alt_val not in mapping:
-                mapping[alt_val] = vals
-
-st.write(f"Loaded {len(mapping)} reference MPN rows from OLD BOM")
+# one row of transfer values per MPN / Alternate key, built from whole OLD columns
+reference = ReferenceIndex(old_df, old_mpn_col, alt_col, actual_old_col_for)
+
+st.write(f"Loaded {len(reference)} reference MPN rows from OLD BOM")
 
 # ---------- Reorder columns ----------
 # Build new header order: [A, B, C] + TRANSFER_COLS + [rest of original columns starting D]
-orig_headers = [c.value for c in ws_new[hdr_new]]
+# The output gets the original header cells (of the line above where a two-line header's lower
+# cell is blank); the stripped header names (a two-line header's combined labels) are only matched
+upper_line, lower_line = sheet_rows(ws_new, hdr_new-1, hdr_new, len(new_headers))
+orig_headers = [
+    lo if not name or str(lo).strip() == name else up
+    for up, lo, name in zip(upper_line, lower_line, new_headers)
+]
 first3 = orig_headers[:3]
 rest = orig_headers[3:]
 final_headers = first3 + TRANSFER_COLS_LOGICAL + rest
-
-# Create new workbook to avoid formula breakage
-from openpyxl import Workbook
-wb_out = Workbook()
-ws_out = wb_out.active
-
-# write headers
-for c, h in enumerate(final_headers, start=1):
-    ws_out.cell(row=hdr_new, column=c, value=h)
+final_names = new_headers[:3] + TRANSFER_COLS_LOGICAL + new_headers[3:]
+# the NEW column (0-based) under each of final_headers, None for the inserted transfer columns
+orig_cols = list(range(len(orig_headers)))
+final_cols = orig_cols[:3] + [None] * len(TRANSFER_COLS_LOGICAL) + orig_cols[3:]
 
 # get col index of MPN in new_df
 try:
@@ -146,30 +112,36 @@ try:
 except Exception:
     mpn_idx_new = None
 
-# copy rows
+# read the NEW data rows once (value or formula per cell, None when blank)
 max_row_new = ws_new.max_row
-for r in range(hdr_new+1, max_row_new+1):
-    row_vals = {}
-    for i, h in enumerate(orig_headers, start=1):
-        cell = ws_new.cell(row=r, column=i)
-        row_vals[h] = cell.value
-
-    mpn_val = ws_new.cell(row=r, column=mpn_idx_new).value if mpn_idx_new else None
-    mpn_key = str(mpn_val).strip() if mpn_val is not None else ""
-    mapped_vals = mapping.get(mpn_key)
-
-    # write row according to final_headers
-    for c, h in enumerate(final_headers, start=1):
-        if h in TRANSFER_COLS_LOGICAL:
+new_rows = sheet_rows(ws_new, hdr_new+1, max_row_new, len(orig_headers))
+
+# look up every row's MPN in the reference index at once (None → no OLD row)
+matches = reference.lookup([vals[mpn_idx_new-1] if mpn_idx_new else None for vals in new_rows])
+
+# per output column: the NEW column (0-based) it is copied from; transfer columns are filled from the mapped values
+copy_from = [None if h in TRANSFER_COLS_LOGICAL else j for h, j in zip(final_names, final_cols)]
+transfer_at = [(c, h) for c, h in enumerate(final_names) if h in TRANSFER_COLS_LOGICAL]
+
+
+def output_rows():
+    yield final_headers
+    for values, mapped_vals in zip(new_rows, matches):
+        # row according to final_headers
+        row = [values[j] if j is not None else None for j in copy_from]
+        for c, h in transfer_at:
             v = mapped_vals.get(h) if mapped_vals else None
             if h.lower() == "remarks":
                 if mapped_vals and mapped_vals.get("Remarks"):
                     v = mapped_vals.get("Remarks")
                 elif not mapped_vals:
                     v = "New Part"
-            ws_out.cell(row=r, column=c, value=v)
-        else:
-            ws_out.cell(row=r, column=c, value=row_vals.get(h, None))
+            row[c] = v
+        yield row
+
+
+# write to a new (streamed) workbook to avoid formula breakage: headers, then the copied rows
+wb_out = rows_workbook(output_rows(), first_row=hdr_new)
 
 # ---------- Save result ----------
 buffer = BytesIO()
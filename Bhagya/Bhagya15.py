@@ -2,7 +2,8 @@
 import streamlit as st
 import pandas as pd
 from io import BytesIO
-from openpyxl import load_workbook
+from bom_io import ReferenceIndex, load_bom
+from bom_sheet import insert_columns
 from openpyxl.styles import PatternFill
 import difflib
 
@@ -10,17 +11,6 @@ st.set_page_config(layout="wide")
 st.title("🔄 BOM Supplier Mapping (OLD → NEW)")
 
 # ---------- helpers ----------
-def detect_header_row_ws(ws, look_for=('mpn','manufacturer','coreel','part number')):
-    max_check = min(30, ws.max_row)
-    for r in range(1, max_check+1):
-        rowvals = []
-        for c in range(1, min(300, ws.max_column)+1):
-            v = ws.cell(row=r, column=c).value
-            rowvals.append(str(v).strip().lower() if v else "")
-        if any(any(x in cell for cell in rowvals) for x in look_for):
-            return r
-    return 1
-
 def find_best_col_name(logical_name, available_cols):
     low_map = {str(c).strip().lower(): c for c in available_cols}
     key = logical_name.strip().lower()
@@ -53,25 +43,15 @@ if not old_file or not new_file:
 try:
     old_bytes = old_file.read()
     new_bytes = new_file.read()
-    wb_old = load_workbook(filename=BytesIO(old_bytes), data_only=True)
-    wb_new = load_workbook(filename=BytesIO(new_bytes), data_only=False)  # keep formulas
-    ws_old = wb_old.active
-    ws_new = wb_new.active
+    # each BOM is parsed once: header row, DataFrame and worksheet all come from that parse
+    wb_old, ws_old, hdr_old, old_headers, old_df = load_bom(old_bytes)
+    wb_new, ws_new, hdr_new, new_headers, new_df = load_bom(new_bytes, keep_formulas=True)  # keep formulas
 except Exception as e:
     st.error(f"Error loading workbooks: {e}")
     st.stop()
 
-# detect header rows
-hdr_old = detect_header_row_ws(ws_old)
-hdr_new = detect_header_row_ws(ws_new)
 st.info(f"Detected header row → OLD: {hdr_old}, NEW: {hdr_new}")
 
-# read into pandas for easy row lookups (pandas read happens BEFORE we insert columns)
-old_df = pd.read_excel(BytesIO(old_bytes), header=hdr_old-1)
-new_df = pd.read_excel(BytesIO(new_bytes), header=hdr_new-1)
-old_df.columns = [str(c).strip() for c in old_df.columns]
-new_df.columns = [str(c).strip() for c in new_df.columns]
-
 # detect MPN columns (OLD & NEW)
 mpn_candidates = ["mpn", "manufacturer part number", "part number", "mfr p/n", "coreel p/n"]
 def detect_mpn_col_from_list(cols):
@@ -107,34 +87,16 @@ for logical in TRANSFER_COLS_LOGICAL:
     else:
         actual_old_col_for[logical] = actual
 
-mapping = {}
-for _, r in old_df.iterrows():
-    key = r.get(old_mpn_col, None)
-    if pd.isna(key):
-        continue
-    key_str = str(key).strip().lower()
-    vals = {}
-    for logical in TRANSFER_COLS_LOGICAL:
-        actual_col = actual_old_col_for[logical]
-        vals[logical] = r.get(actual_col, None) if actual_col in old_df.columns else None
-    # store mapping under lowercase key
-    if key_str not in mapping:
-        mapping[key_str] = vals
-    # also map alternate if present
-    if alt_col:
-        alt_val = r.get(alt_col, None)
-        if pd.notna(alt_val):
-            alt_key = str(alt_val).strip().lower()
-            if alt_key and alt_key not in mapping:
-                mapping[alt_key] = vals
-
-st.write(f"Loaded {len(mapping)} reference MPN rows from OLD BOM")
+# one row of transfer values per MPN / Alternate key, built from whole OLD columns
+reference = ReferenceIndex(old_df, old_mpn_col, alt_col, actual_old_col_for, lower=True)
+
+st.write(f"Loaded {len(reference)} reference MPN rows from OLD BOM")
 
 # ---------- INSERT MAPPED COLUMNS IMMEDIATELY AFTER COLUMN C (i.e., at index 4 / 'D') ----------
 insert_at = 4  # after C
 num_new_cols = len(TRANSFER_COLS_LOGICAL)
-# Insert all mapping columns in one call so existing cells (formulas/styles) are shifted correctly
-ws_new.insert_cols(insert_at, amount=num_new_cols)
+# Insert all mapping columns in one shift; formulas, merged ranges, names and conditional formats follow the moved cells
+insert_columns(ws_new, insert_at, num_new_cols)
 
 # Highlight header fill for inserted headers
 header_fill = PatternFill(start_color="FFFF99", end_color="FFFF99", fill_type="solid")
@@ -149,16 +111,17 @@ for j, h in enumerate(TRANSFER_COLS_LOGICAL):
 max_row_new = ws_new.max_row
 n_rows_df = len(new_df)
 
+# MPN per sheet row from the original dataframe (rows past its end have none), looked up
+# in the lower-cased reference index at once
+mpn_vals = new_df[new_mpn_col].tolist()[:max(max_row_new - hdr_new, 0)]
+matches = reference.lookup(mpn_vals + [None] * (max_row_new - hdr_new - len(mpn_vals)))
+
 # We'll use pandas new_df to read original per-row MPN and original 'Remarks' (if present).
 for r in range(hdr_new + 1, max_row_new + 1):
     df_idx = r - (hdr_new + 1)  # zero-based index into new_df
     orig_row = new_df.iloc[df_idx] if 0 <= df_idx < n_rows_df else None
 
-    # get MPN from original dataframe (robust)
-    mpn_val = orig_row[new_mpn_col] if orig_row is not None else None
-    mpn_key = str(mpn_val).strip().lower() if mpn_val is not None else ""
-
-    mapped_vals = mapping.get(mpn_key)  # mapping keys are lowercased
+    mapped_vals = matches[df_idx]
 
     # original remark (if present in NEW BOM)
     orig_rem = None
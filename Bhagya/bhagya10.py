@@ -2,32 +2,14 @@
 import streamlit as st
 import pandas as pd
 from io import BytesIO
-from openpyxl import load_workbook, Workbook
+from bom_io import ReferenceIndex, load_bom, sheet_rows
+from bom_sheet import rows_workbook
 import difflib
 
 st.set_page_config(layout="wide")
 st.title("🔄 BOM Supplier Mapping (OLD → NEW)")
 
 # ---------- helpers ----------
-def detect_header_row_ws(ws, look_for=('mpn','manufacturer','coreel','part number')):
-    """
-    Find the header row index (1-based) by scanning first 30 rows for a candidate word.
-    Returns header_row (int). Defaults to 1 if not found.
-    """
-    max_check = min(30, ws.max_row)
-    for r in range(1, max_check+1):
-        rowvals = []
-        for c in range(1, min(300, ws.max_column)+1):
-            v = ws.cell(row=r, column=c).value
-            if v is None:
-                rowvals.append('')
-            else:
-                rowvals.append(str(v).strip().lower())
-        # if any candidate substring occurs in the row, assume header row
-        if any(any(x in cell for cell in rowvals) for x in look_for):
-            return r
-    return 1
-
 def find_best_col_name(logical_name, available_cols):
     """
     Return the actual column name from available_cols that best matches logical_name (case-insensitive).
@@ -66,28 +48,15 @@ if not old_file or not new_file:
 try:
     old_bytes = old_file.read()
     new_bytes = new_file.read()
-    wb_old = load_workbook(filename=BytesIO(old_bytes), data_only=True)
-    wb_new = load_workbook(filename=BytesIO(new_bytes), data_only=False)  # we want formula text from new
-    ws_old = wb_old.active
-    ws_new = wb_new.active
+    # each BOM is parsed once: header row, DataFrame and worksheet all come from that parse
+    wb_old, ws_old, hdr_old, old_headers, old_df = load_bom(old_bytes)
+    wb_new, ws_new, hdr_new, new_headers, new_df = load_bom(new_bytes, keep_formulas=True)  # keep formulas
 except Exception as e:
     st.error(f"Error loading workbooks: {e}")
     st.stop()
 
-# detect header rows
-hdr_old = detect_header_row_ws(ws_old)
-hdr_new = detect_header_row_ws(ws_new)
-
 st.info(f"Detected header row → OLD: {hdr_old}, NEW: {hdr_new}")
 
-# Read pandas DataFrames using detected header rows (0-based header index = hdr-1)
-old_df = pd.read_excel(BytesIO(old_bytes), header=hdr_old-1)
-new_df = pd.read_excel(BytesIO(new_bytes), header=hdr_new-1)
-
-# Normalize column lists (strip)
-old_df.columns = [str(c).strip() for c in old_df.columns]
-new_df.columns = [str(c).strip() for c in new_df.columns]
-
 # find actual MPN column names in both files (case-insensitive / fuzzy)
 mpn_candidates = ["mpn", "manufacturer part number", "part number", "mfr p/n", "coreel p/n"]
 def detect_mpn_col_from_list(cols):
@@ -126,38 +95,17 @@ for logical in TRANSFER_COLS_LOGICAL:
     else:
         actual_old_col_for[logical] = actual
 
-# Build mapping dictionary from OLD BOM: key -> dict-of-transfer-values
-# keys: MPN and Alternate (if present)
-mapping = {}
-for _, r in old_df.iterrows():
-    key = r.get(old_mpn_col, None)
-    if pd.isna(key):
-        continue
-    key = str(key).strip()
-    # build values dict using actual_old_col_for mapping
-    vals = {}
-    for logical in TRANSFER_COLS_LOGICAL:
-        actual_col = actual_old_col_for[logical]
-        vals[logical] = r.get(actual_col, None) if actual_col in old_df.columns else None
-    # set mapping for mpn if not present already
-    if key not in mapping:
-        mapping[key] = vals
-    # also map alternate if available
-    if alt_col:
-        alt_val = r.get(alt_col, None)
-        if pd.notna(alt_val):
-            alt_val = str(alt_val).strip()
-            if alt_val and alt_val not in mapping:
-                mapping[alt_val] = vals
+# Build reference index from OLD BOM (whole columns): key -> row of transfer values
+# keys: MPN and Alternate (if present), the first OLD row with a key wins
+reference = ReferenceIndex(old_df, old_mpn_col, alt_col, actual_old_col_for)
 
-st.write(f"Loaded {len(mapping)} reference MPN rows from OLD BOM")
+st.write(f"Loaded {len(reference)} reference MPN rows from OLD BOM")
 
-# Build header_map for NEW worksheet using openpyxl header row (to find column indexes)
+# Build header_map for NEW worksheet from its header names (to find column indexes)
 header_map_new = {}
-for c in range(1, ws_new.max_column + 1):
-    val = ws_new.cell(row=hdr_new, column=c).value
-    if val is not None:
-        header_map_new[str(val).strip()] = c
+for c, val in enumerate(new_headers, start=1):
+    if val:
+        header_map_new[val] = c
 
 # Prepare final header order:
 new_cols = list(new_df.columns)
@@ -178,46 +126,42 @@ after = new_cols[manuf_idx:]   # includes Manufacturer and everything after
 after_filtered = [c for c in after if c not in TRANSFER_COLS_LOGICAL]
 final_headers = before + TRANSFER_COLS_LOGICAL + after_filtered
 
-# Build output workbook and worksheet
-wb_out = Workbook()
-ws_out = wb_out.active
-
-# Write header row into output at same header row index
-for col_i, header in enumerate(final_headers, start=1):
-    ws_out.cell(row=hdr_new, column=col_i, value=header)
-
 # Build reverse map: header name -> column index in input NEW sheet (if available)
 # header_map_new already holds this; but keys might differ in case/spacing, so build normalized lookup
 norm_header_map_new = {str(k).strip(): v for k, v in header_map_new.items()}
 
-# Iterate data rows and populate values in ws_out
-max_row_new = ws_new.max_row
-for r in range(hdr_new + 1, max_row_new + 1):
-    # read original row values for new sheet into a dict (header->value), use header_map_new
-    orig_values = {}
-    for hdr_name, col_idx in norm_header_map_new.items():
-        orig_values[hdr_name] = ws_new.cell(row=r, column=col_idx).value
-
-    # get mpn key (use the header string exactly as in new_df columns)
-    mpn_val = None
-    # find the column index for mpn_name in ws_new header map; if not found fallback to scanning orig_values keys for close match
-    mpn_col_idx = norm_header_map_new.get(mpn_name)
-    if mpn_col_idx:
-        mpn_val = ws_new.cell(row=r, column=mpn_col_idx).value
-    else:
-        # fallback: search in orig_values by fuzzy match
-        for k in orig_values.keys():
-            if k.strip().lower() == mpn_name.strip().lower():
-                mpn_val = orig_values[k]
-                break
+# find the column index for mpn_name in ws_new header map; if not found fallback to a case-insensitive match
+mpn_col_idx = norm_header_map_new.get(mpn_name)
+if not mpn_col_idx:
+    mpn_col_idx = next(
+        (idx for k, idx in norm_header_map_new.items() if k.strip().lower() == mpn_name.strip().lower()), None
+    )
 
-    mpn_key = str(mpn_val).strip() if mpn_val is not None else ""
+# Read the NEW data rows once (value or formula per cell, None when blank)
+max_row_new = ws_new.max_row
+new_rows = sheet_rows(ws_new, hdr_new + 1, max_row_new, ws_new.max_column)
 
-    mapped_vals = mapping.get(mpn_key)
+# Look up every NEW row's MPN in the reference index at once (None → no OLD row)
+matches = reference.lookup([vals[mpn_col_idx - 1] if mpn_col_idx else None for vals in new_rows])
 
-    # for each header in final_headers, write either mapped value (if transfer col) or original cell (copy formula/value)
-    for c_idx, header in enumerate(final_headers, start=1):
-        if header in TRANSFER_COLS_LOGICAL:
+# Per output column: the NEW column (0-based) its value/formula is copied from, None when blank;
+# transfer columns are filled from the mapped values instead
+copy_from = [
+    None if header in TRANSFER_COLS_LOGICAL or header not in norm_header_map_new else norm_header_map_new[header] - 1
+    for header in final_headers
+]
+transfer_at = [(c, header) for c, header in enumerate(final_headers) if header in TRANSFER_COLS_LOGICAL]
+remarks_idx = norm_header_map_new.get('Remarks')
+remarks_df = new_df['Remarks'].tolist() if 'Remarks' in new_df.columns else None
+
+
+def output_rows():
+    yield final_headers
+    for idx, (values, mapped_vals) in enumerate(zip(new_rows, matches)):
+        # copy original cells (value or formula) into the final header order
+        row = [values[j] if j is not None else None for j in copy_from]
+        # write mapped value (if transfer col)
+        for c, header in transfer_at:
             # get mapped value if present
             if mapped_vals:
                 v = mapped_vals.get(header, None)
@@ -227,17 +171,11 @@ for r in range(hdr_new + 1, max_row_new + 1):
             if header == "Remarks":
                 # original remark from new file (if any)
                 orig_rem = None
-                # try to find original 'Remarks' in orig_values (case sensitive exact)
-                if 'Remarks' in orig_values and orig_values['Remarks'] is not None:
-                    orig_rem = orig_values['Remarks']
-                elif 'Remarks' in new_df.columns:
-                    # fallback to pandas new_df row value (index r - header_row - 1)
-                    try:
-                        idx = r - (hdr_new + 1)
-                        if idx >= 0 and idx < len(new_df):
-                            orig_rem = new_df.iloc[idx][ 'Remarks' ] if 'Remarks' in new_df.columns else None
-                    except Exception:
-                        orig_rem = None
+                if remarks_idx and values[remarks_idx - 1] is not None:
+                    orig_rem = values[remarks_idx - 1]
+                elif remarks_df is not None and idx < len(remarks_df):
+                    # fallback to pandas new_df row value
+                    orig_rem = remarks_df[idx]
                 if mapped_vals and mapped_vals.get('Remarks') not in (None, ''):
                     v = mapped_vals.get('Remarks')
                 else:
@@ -245,17 +183,12 @@ for r in range(hdr_new + 1, max_row_new + 1):
                         v = "New Part"
                     elif orig_rem is not None and (not mapped_vals):
                         v = orig_rem
-            ws_out.cell(row=r, column=c_idx, value=v)
-        else:
-            # copy original cell (value or formula). We need to find original column index for this header.
-            orig_col_idx = norm_header_map_new.get(header)
-            if orig_col_idx:
-                orig_cell = ws_new.cell(row=r, column=orig_col_idx)
-                # Copy the cell value/formula
-                ws_out.cell(row=r, column=c_idx, value=orig_cell.value)
-            else:
-                # header not in original new sheet (rare) => leave blank
-                ws_out.cell(row=r, column=c_idx, value=None)
+            row[c] = v
+        yield row
+
+
+# Build output workbook: header row at the same index, then the data rows, streamed row by row
+wb_out = rows_workbook(output_rows(), first_row=hdr_new)
 
 # Save to buffer and provide download
 buffer = BytesIO()
@@ -272,7 +205,7 @@ st.download_button(
 
 # Show small preview (pandas) for convenience
 try:
-    df_preview = pd.read_excel(BytesIO(buffer.getvalue()), header=hdr_new-1)
+    df_preview = pd.read_excel(BytesIO(buffer.getvalue()), header=hdr_new-1, nrows=40)  # only the rows shown
     st.subheader("Preview (first 40 rows)")
     st.dataframe(df_preview.head(40))
 except Exception:
@@ -0,0 +1,416 @@
+# bom_io.py
+"""
+One-parse loading of uploaded BOM workbooks for the BOM mapping apps.
+
+Each uploaded BOM is parsed by openpyxl once; the header row, the pandas DataFrame view
+and (for the NEW / target BOM) the formula-preserving worksheet all come from that parse
+instead of re-reading the same bytes with pd.read_excel. openpyxl drops a formula cell's
+cached result when it keeps the formula, so those results are read from the sheet XML
+by a light ElementTree scan that only keeps formula cells.
+
+ReferenceIndex keys the OLD BOM's transfer columns by MPN / Alternate MPN, built and
+joined against the NEW BOM's MPN column as whole columns.
+"""
+import posixpath
+import zipfile
+from io import BytesIO
+from xml.etree.ElementTree import fromstring, iterparse
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_FORMULA, TYPE_NUMERIC
+from openpyxl.styles.numbers import is_date_format, is_timedelta_format
+from openpyxl.utils.cell import coordinate_to_tuple
+from openpyxl.utils.datetime import from_excel
+from openpyxl.xml.constants import PKG_REL_NS, REL_NS, SHEET_MAIN_NS
+from pandas.errors import EmptyDataError
+from pandas.io.parsers import TextParser
+
+HEADER_KEYWORDS = ('mpn', 'manufacturer', 'coreel', 'part number')
+HEADER_SCAN_ROWS = 30
+HEADER_SCAN_COLS = 300
+HEADER_CELL_MAX_LEN = 40    # longer text is a title / note, not a column label
+
+
+def _label(v):
+    return str(v).strip() if v is not None else ''
+
+
+def _is_keyword_label(v, look_for):
+    label = _label(v).lower()
+    return len(label) <= HEADER_CELL_MAX_LEN and any(x in label for x in look_for)
+
+
+def _scan_rows(ws, n_rows=HEADER_SCAN_ROWS):
+    # bounded by the sheet's width: on a loaded worksheet iter_rows creates every cell it visits
+    max_col = min(HEADER_SCAN_COLS, ws.max_column or HEADER_SCAN_COLS)
+    return [list(row) for row in ws.iter_rows(min_row=1, max_row=n_rows, max_col=max_col, values_only=True)]
+
+
+def _line_score(line, look_for, width):
+    """(keyword hits, score) of one candidate header line (raw cell values)."""
+    filled = [_label(v) for v in line if _label(v)]
+    if not filled:
+        return 0, 0.0
+    labels = [v.lower() for v in filled if _is_keyword_label(v, look_for)]
+    hits = sum(1 for x in look_for if any(x in label for label in labels))
+    text = sum(1 for v in line if isinstance(v, str) and v.strip()) / len(filled)
+    # keyword hits decide; non-empty density and share of text cells break ties
+    return hits, hits + len(filled) / width + text
+
+
+def _is_label_text(v):
+    # blank, or short non-numeric text: data rows often hold their numbers as text
+    label = _label(v)
+    if not label:
+        return True
+    if not isinstance(v, str) or len(label) > HEADER_CELL_MAX_LEN:
+        return False
+    try:
+        float(label.replace(",", ""))
+    except ValueError:
+        return True
+    return False
+
+
+def _two_line(upper, lower):
+    """
+    (labels for scoring, column names, open columns) of two header lines read as one:
+    scoring sees "upper lower" so a group label over its sub-labels still counts; a column's
+    name is its lower label, or the one above it when the lower cell is blank (vertically
+    merged). Open columns are where the lower line sits under a blank upper cell or under
+    a group label (one followed by blank upper cells with lower labels under them).
+    """
+    width = max(len(upper), len(lower))
+    upper = [_label(v) for v in upper] + [''] * (width - len(upper))
+    lower = [_label(v) for v in lower] + [''] * (width - len(lower))
+    joined = [f"{up} {lo}".strip() for up, lo in zip(upper, lower)]
+    open_cols = []
+    group = False
+    for i, (up, lo) in enumerate(zip(upper, lower)):
+        if up:
+            group = i + 1 < width and not upper[i + 1] and bool(lower[i + 1])
+        if not up or group:
+            open_cols.append(i)
+    return joined, [lo or up for up, lo in zip(upper, lower)], open_cols
+
+
+def sniff_header(rows, look_for=HEADER_KEYWORDS):
+    """
+    Pick the header among the first rows of a sheet (lists of cell values). Every row is
+    scored on distinct keyword hits in label-length cells, then on non-empty density and
+    share of text cells, so a title or note row that merely mentions "MPN" loses to the
+    real header. Two adjacent text-only rows are taken as one two-line / merged header when
+    the upper one has at least two labels (a title row has one), the lower one holds only
+    short non-numeric labels and is blank under the upper one's keyword labels (group
+    labels excepted: their sub-labels sit under them), and either the lower labels under
+    blank or group cells of the upper one add keywords neither line has alone, or the lower
+    one is blank under every keyword column of the upper one (a data row never is).
+
+    Returns (header_row, names): the 1-based row the data starts below (the lower line of
+    a two-line header) and, for a two-line header, the combined name per column (else
+    None). Defaults to (1, None) when no row has a keyword.
+
+    >>> sniff_header([["Sl No", "Description", "MPN", "Manufacturer", "Qty"],
+    ...               ["1", "Res", "R1", "Coreel", "5"]])
+    (1, None)
+    >>> sniff_header([["Coreel BOM"], ["S.No", "MPN", "Manufacturer", "Qty"], [1, "R1", "TI", 5]])
+    (2, None)
+    >>> sniff_header([["S.No", "MPN", "Manufacturer", "Supplier", None],
+    ...               [None, None, None, "Name", "Price"], [1, "R1", "TI", "Mouser", 0.5]])
+    (2, ['S.No', 'MPN', 'Manufacturer', 'Name', 'Price'])
+    """
+    filled = [sum(1 for v in row if _label(v)) for row in rows]
+    width = max(filled, default=0) or 1
+    scores = [_line_score(row, look_for, width) for row in rows]
+    best_score, header_row, names = 0.0, 1, None
+    for r, (hits, score) in enumerate(scores, start=1):
+        if hits and score > best_score:
+            best_score, header_row, names = score, r, None
+
+    for r in range(1, len(rows)):
+        upper, lower = rows[r - 1], rows[r]
+        if filled[r - 1] < 2 or not filled[r]:
+            continue
+        if not all(isinstance(v, str) for v in upper if _label(v)) or not all(_is_label_text(v) for v in lower):
+            continue  # data rows carry numbers
+        joined, combined, open_cols = _two_line(upper, lower)
+        key_cols = [i for i, v in enumerate(upper) if _is_keyword_label(v, look_for)]
+        below = [i for i in key_cols if i < len(lower) and _label(lower[i])]
+        if any(i not in open_cols for i in below):
+            continue  # a value under a plain keyword label: a data row
+        hits, score = _line_score(joined, look_for, width)
+        opened = list(upper) + [lower[i] for i in open_cols if i < len(lower)]
+        more_hits = _line_score(opened, look_for, width)[0] > max(scores[r - 1][0], scores[r][0])
+        merged_below = key_cols and not below
+        if (more_hits or (merged_below and hits >= scores[r - 1][0])) and score > best_score:
+            best_score, header_row, names = score, r + 1, combined
+    return header_row, names
+
+
+def detect_header_row_ws(ws, look_for=HEADER_KEYWORDS):
+    """
+    Find the header row index (1-based) among the first HEADER_SCAN_ROWS rows, see
+    sniff_header. Only those rows are read, so on a read-only (streamed) worksheet this
+    takes milliseconds whatever the file size. Returns header_row (int), 1 if not found.
+    """
+    return sniff_header(_scan_rows(ws), look_for)[0]
+
+
+def _apply_two_line_names(df, names):
+    # blank lower-line labels ("Unnamed: n") take the label above them, when it's free
+    columns = list(df.columns)
+    for i, col in enumerate(columns):
+        label = names[i] if i < len(names) else ""
+        if col.startswith("Unnamed: ") and label and label not in columns:
+            columns[i] = label
+    df.columns = columns
+    return df
+
+
+def _part_rels(archive, part):
+    # {relationship id: target part} of a package part ("" for the package itself)
+    folder, name = posixpath.split(part)
+    rels = fromstring(archive.read(posixpath.join(folder, "_rels", name + ".rels")))
+    targets = {}
+    for rel in rels.iter(f"{{{PKG_REL_NS}}}Relationship"):
+        target = rel.get("Target")
+        targets[rel.get("Id")] = target.lstrip("/") if target.startswith("/") else posixpath.normpath(
+            posixpath.join(folder, target))
+    return targets, {rel.get("Type", "").rsplit("/", 1)[-1]: rel.get("Id") for rel in rels}
+
+
+def _sheet_part(archive, title):
+    """Zip member holding worksheet `title`: package rels → workbook → its sheet entry."""
+    targets, by_type = _part_rels(archive, "")
+    workbook = targets[by_type["officeDocument"]]
+    sheets = fromstring(archive.read(workbook)).iter(f"{{{SHEET_MAIN_NS}}}sheet")
+    rel_id = next(sheet.get(f"{{{REL_NS}}}id") for sheet in sheets if sheet.get("name") == title)
+    return _part_rels(archive, workbook)[0][rel_id]
+
+
+def _cached_result(cell, kind, text, epoch):
+    # a formula's cached result as data_only loading and then pandas' reader would give it
+    if not text:
+        return ""
+    if kind == "e":
+        return np.nan
+    if kind == "b":
+        return bool(int(text))
+    if kind not in (None, "n"):
+        return text  # "str": text results are stored inline
+    value = float(text)
+    if is_date_format(cell.number_format):
+        return from_excel(value, epoch, timedelta=is_timedelta_format(cell.number_format))
+    return int(value) if value.is_integer() else value
+
+
+def _formula_results(data, ws):
+    """
+    {(row, col): cached result} of the formula cells of loaded worksheet `ws`, read from the
+    uploaded bytes. openpyxl keeps a formula or its result, never both; instead of loading
+    the workbook a second time with data_only=True, the sheet XML is scanned once and only
+    cells with a formula are kept (rows are cleared as they end).
+    """
+    c_tag, f_tag, v_tag, row_tag = (f"{{{SHEET_MAIN_NS}}}{t}" for t in ("c", "f", "v", "row"))
+    results = {}
+    with zipfile.ZipFile(BytesIO(data)) as archive, archive.open(_sheet_part(archive, ws.title)) as fh:
+        row = col = 0
+        for event, el in iterparse(fh, events=("start", "end")):
+            if el.tag == row_tag:
+                if event == "start":
+                    row, col = int(el.get("r") or row + 1), 0
+                else:
+                    el.clear()
+            elif el.tag == c_tag and event == "end":
+                ref = el.get("r")
+                col = coordinate_to_tuple(ref)[1] if ref else col + 1
+                if el.find(f_tag) is not None:
+                    cell = ws.cell(row=row, column=col)
+                    results[(row, col)] = _cached_result(cell, el.get("t"), el.findtext(v_tag), ws.parent.epoch)
+    return results
+
+
+def _loaded_cells(ws, min_row=1, max_row=None, max_col=None):
+    """
+    (row, column, cell) of the cells a loaded worksheet holds within the given bounds. They
+    come from openpyxl's private ws._cells dict, because iter_rows / ws.cell create a cell
+    object at every blank position they visit, which is most of a wide BOM. Where that
+    attribute isn't there (another openpyxl release) the public iter_rows is used instead.
+    """
+    cells = getattr(ws, "_cells", None)
+    if isinstance(cells, dict):
+        for (r, c), cell in cells.items():
+            if min_row <= r and (max_row is None or r <= max_row) and (max_col is None or c <= max_col):
+                yield r, c, cell
+        return
+    max_row = ws.max_row if max_row is None else max_row
+    max_col = ws.max_column if max_col is None else max_col
+    if min_row <= max_row and max_col >= 1:
+        for row in ws.iter_rows(min_row=min_row, max_row=max_row, max_col=max_col):
+            for cell in row:
+                yield cell.row, cell.column, cell
+
+
+def _convert_cell(cell):
+    # same conversion as pandas' openpyxl reader
+    if cell.value is None:
+        return ""
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        val = int(cell.value)
+        return val if val == cell.value else float(cell.value)
+    return cell.value
+
+
+def _loaded_sheet_data(ws, results):
+    """
+    Rows of cell values of a fully loaded worksheet, as pandas' openpyxl reader builds them
+    from a data_only load (blank → "", trailing blank rows dropped, rows padded to the
+    widest one); formula cells take their cached result from `results`. Only the cells
+    openpyxl loaded are visited: iterating the sheet the way pandas does creates a cell
+    object for every blank position of the used range, which is most of a wide BOM.
+    """
+    by_row = {}
+    width = 0
+    for r, c, cell in _loaded_cells(ws):
+        v = results.get((r, c), "") if cell.data_type == TYPE_FORMULA else _convert_cell(cell)
+        if isinstance(v, str) and v == "":
+            continue
+        by_row.setdefault(r, {})[c] = v
+        width = max(width, c)
+    if not by_row:
+        return []
+    return [
+        [cells.get(c, "") for c in range(1, width + 1)]
+        for cells in (by_row.get(r, {}) for r in range(1, max(by_row) + 1))
+    ]
+
+
+def sheet_rows(ws, min_row, max_row, max_col):
+    """
+    Cell values (formula text for formulas, None when blank) of rows min_row..max_row and
+    columns 1..max_col of a loaded worksheet, one list per row (rows above row 1 are blank).
+    Only the loaded cells are visited, see _loaded_cells.
+    """
+    rows = [[None] * max_col for _ in range(max(max_row - min_row + 1, 0))]
+    for r, c, cell in _loaded_cells(ws, max(min_row, 1), max_row, max_col):
+        rows[r - min_row][c - 1] = cell.value
+    return rows
+
+
+def sheet_frame(wb, ws, header_row, results=None):
+    """
+    DataFrame of `ws` with `header_row` (1-based) as the header, built from the already
+    parsed workbook with the same conversion as pd.read_excel; column names are stripped
+    strings. For a workbook loaded with its formulas, `results` holds the formula cells'
+    cached values (see _formula_results), which the DataFrame shows in their place.
+    """
+    if wb.read_only:
+        # ExcelFile.parse instead of pd.read_excel(wb): read_excel closes the workbook afterwards
+        df = pd.ExcelFile(wb, engine="openpyxl").parse(ws.title, header=header_row - 1)
+    else:
+        data = _loaded_sheet_data(ws, results or {})
+        try:
+            df = TextParser(data, header=header_row - 1, skip_blank_lines=False).read() if data else pd.DataFrame()
+        except EmptyDataError:
+            df = pd.DataFrame()
+    df.columns = [str(c).strip() for c in df.columns]
+    return df
+
+
+def _header_names(ws, header_row, two_line):
+    # every column of the header row(s), not just the scanned width
+    first = header_row - 1 if two_line else header_row
+    lines = [list(row) for row in ws.iter_rows(min_row=first, max_row=header_row, values_only=True)]
+    if two_line:
+        lines += [[]] * (2 - len(lines))
+        return _two_line(*lines)[1]
+    return [_label(v) for v in (lines[0] if lines else [])]
+
+
+def load_bom(data, keep_formulas=False, look_for=HEADER_KEYWORDS):
+    """
+    Load an uploaded BOM. Returns (workbook, active worksheet, header row, header names,
+    DataFrame). Header names are the stripped label of every sheet column ("" when blank),
+    for locating columns on the worksheet. With a two-line header the header row is its
+    lower line, and a column whose lower label is blank takes the label above it, in the
+    header names and (when that name is free) in the DataFrame columns.
+
+    The DataFrame holds cell values, a formula's last computed result included, as
+    pd.read_excel would give them. keep_formulas=False loads cell values in read-only
+    (streaming) mode: for the OLD / reference BOM, which is only read. keep_formulas=True
+    loads the full workbook with formula text kept, so it can be edited and saved: for the
+    NEW / target BOM; its formula results come from a scan of the sheet XML
+    (_formula_results), not from a second load of the workbook.
+    """
+    if keep_formulas:
+        wb = load_workbook(filename=BytesIO(data), data_only=False)
+    else:
+        wb = load_workbook(filename=BytesIO(data), read_only=True, data_only=True)
+    ws = wb.active
+    header_row, names = sniff_header(_scan_rows(ws), look_for)
+    headers = _header_names(ws, header_row, names is not None)
+    df = sheet_frame(wb, ws, header_row, _formula_results(data, ws) if keep_formulas else None)
+    if names:
+        df = _apply_two_line_names(df, headers)
+    return wb, ws, header_row, headers, df
+
+
+def _key_text(values, lower=False):
+    # str(value).strip() per value (lower-cased for case-insensitive matching), whole column at once
+    text = pd.Series(values, dtype=object).astype(str).str.strip()
+    return text.str.lower() if lower else text
+
+
+class ReferenceIndex:
+    """
+    OLD-BOM reference values by MPN, built from whole columns: one row of the transfer
+    columns per distinct key, in a frame indexed by key. Each OLD row contributes its MPN
+    and then its Alternate MPN (when not blank); a key keeps the first row that claims it,
+    in that order. Rows without an MPN are skipped, Alternate included.
+
+    columns maps each transfer column's logical name to the OLD column it is read from.
+    With lower=True keys are matched case-insensitively.
+    """
+
+    def __init__(self, old_df, mpn_col, alt_col, columns, lower=False):
+        self.lower = lower
+        has_mpn = old_df[mpn_col].notna().to_numpy()
+        keys = [_key_text(old_df[mpn_col], lower).to_numpy(dtype=object)]
+        valid = [has_mpn]
+        if alt_col:
+            alt = old_df[alt_col]
+            alt_keys = _key_text(alt, lower).to_numpy(dtype=object)
+            keys.append(alt_keys)
+            valid.append(has_mpn & alt.notna().to_numpy() & (alt_keys != ""))
+
+        # row-major stacking interleaves them: MPN 0, Alternate 0, MPN 1, Alternate 1, ...
+        keys = np.column_stack(keys).ravel()
+        rows = np.repeat(np.arange(len(old_df)), len(valid))
+        valid = np.column_stack(valid).ravel()
+        keys, rows = keys[valid], rows[valid]
+        first = ~pd.Index(keys).duplicated(keep="first")
+
+        self.frame = old_df[list(columns.values())].iloc[rows[first]]
+        self.frame.columns = list(columns)
+        self.frame.index = pd.Index(keys[first], dtype=object)
+        self.frame.index.get_indexer(self.frame.index[:1])  # build the hash table now
+
+    def __len__(self):
+        return len(self.frame)
+
+    def lookup(self, values):
+        """
+        One join of NEW-BOM MPN cell values against the index: per value, a {logical
+        column: value} dict of the matched OLD row, or None when the MPN isn't in the OLD
+        BOM. Blank (None) cells are looked up as "".
+        """
+        values = pd.Series(values, dtype=object)
+        keys = _key_text(values, self.lower).where(np.not_equal(values.to_numpy(), None), "")
+        positions = self.frame.index.get_indexer(keys)
+        found = np.unique(positions[positions >= 0])
+        records = dict(zip(found.tolist(), self.frame.iloc[found].to_dict("records")))
+        return [records.get(p) for p in positions.tolist()]
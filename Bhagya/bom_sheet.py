@@ -0,0 +1,210 @@
+# bom_sheet.py
+"""
+Worksheet output for the BOM mapping apps.
+
+openpyxl's insert_cols moves the cells one by one (once per call, so inserting 15 columns
+one at a time shifts the sheet 15 times) and leaves formulas, merged ranges, defined
+names, conditional formats and data validations pointing at the old columns.
+insert_columns shifts every cell once and rewrites those references the way Excel does.
+
+The apps that rebuild the BOM in a new workbook write it with rows_workbook: whole rows
+streamed into a write-only workbook instead of one ws.cell() call per cell.
+"""
+import re
+
+from openpyxl import Workbook
+from openpyxl.cell.cell import MergedCell
+from openpyxl.formatting.formatting import ConditionalFormattingList
+from openpyxl.utils import column_index_from_string, get_column_letter
+from openpyxl.worksheet.cell_range import MultiCellRange
+from openpyxl.worksheet.formula import ArrayFormula
+
+# A reference inside a formula, with an optional sheet prefix. String literals and
+# [structured] / [external book] parts are matched first so nothing inside them is touched.
+_REF = re.compile(
+    r'''"(?:[^"]|"")*"'''
+    r'''|\[(?:[^\[\]]|\[[^\]]*\])*\]'''
+    r'''|(?<![\w.$\]!])'''
+    r'''(?P<sheet>(?:'(?:[^']|'')+'|[A-Za-z_\\][\w.]*)!)?'''
+    r'''(?P<ref>\$?[A-Za-z]{1,3}\$?\d+(?::\$?[A-Za-z]{1,3}\$?\d+)?|\$?[A-Za-z]{1,3}:\$?[A-Za-z]{1,3})'''
+    r'''(?![\w(.!])'''
+)
+_PART = re.compile(r"(\$?)([A-Za-z]{1,3})(.*)")
+_DIGITS = re.compile(r"\d+")
+
+
+class _ColumnShift:
+    """
+    Reference rewriting for `amount` columns inserted before column `idx` of sheet `title`:
+    a column at or right of idx moves right, a range that spans idx grows. Results are
+    cached per insertion: per column, per reference and per formula. Copied-down formulas
+    differ only in their row numbers, so a formula without sheet-qualified references
+    is cached on its text with every digit run as "0" and its own digits put back.
+    """
+
+    def __init__(self, title, idx, amount):
+        self.title = title.lower()
+        self.idx = idx
+        self.amount = amount
+        self._columns = {}
+        self._refs = {}
+        self._formulas = {}
+
+    def column(self, letters):
+        new = self._columns.get(letters)
+        if new is None:
+            col = column_index_from_string(letters.upper())
+            new = get_column_letter(col + self.amount) if col >= self.idx else letters
+            self._columns[letters] = new
+        return new
+
+    def _col(self, part):
+        return column_index_from_string(_PART.match(part).group(2).upper())
+
+    def _move(self, part):
+        dollar, letters, rest = _PART.match(part).groups()
+        return f"{dollar}{self.column(letters)}{rest}"
+
+    def ref(self, ref):
+        """One reference ("A1", "$B$2:D9", "C:E") with its columns moved."""
+        new = self._refs.get(ref)
+        if new is None:
+            if ":" in ref:
+                start, end = ref.split(":")
+                if self._col(start) >= self.idx:
+                    new = f"{self._move(start)}:{self._move(end)}"
+                else:  # left of the insertion, or spanning it (only the end moves)
+                    new = f"{start}:{self._move(end)}"
+            else:
+                new = self._move(ref)
+            self._refs[ref] = new
+        return new
+
+    def ranges(self, sqref):
+        """A MultiCellRange (sqref) with its ranges moved."""
+        return MultiCellRange(" ".join(self.ref(str(cr)) for cr in sqref.ranges))
+
+    def _rewrite(self, text, local):
+        def sub(m):
+            if m.group("ref") is None:
+                return m.group(0)  # string literal or [bracketed] part
+            sheet = m.group("sheet")
+            if sheet is None:
+                if not local:
+                    return m.group(0)
+            elif sheet[:-1].strip("'").replace("''", "'").lower() != self.title:
+                return m.group(0)
+            return (sheet or "") + self.ref(m.group("ref"))
+        return _REF.sub(sub, text)
+
+    def formula(self, text, local=True):
+        """
+        A formula with its references to this sheet moved. local: unqualified references
+        are to this sheet (formulas on it), else only 'Sheet'!A1 ones count.
+        """
+        if "!" in text or not local:
+            new = self._formulas.get((text, local))
+            if new is None:
+                new = self._formulas[(text, local)] = self._rewrite(text, local)
+            return new
+        template = _DIGITS.sub("0", text)
+        pieces = self._formulas.get(template)
+        if pieces is None:
+            pieces = self._formulas[template] = _DIGITS.split(self._rewrite(template, True))
+        digits = _DIGITS.findall(text)
+        out = [pieces[0]]
+        for d, piece in zip(digits, pieces[1:]):
+            out += (d, piece)
+        return "".join(out)
+
+
+def _rewrite_cell(cell, shift, local):
+    value = cell.value
+    if isinstance(value, ArrayFormula):
+        value.text = shift.formula(value.text, local)
+        if local:
+            value.ref = shift.ref(value.ref)
+    else:
+        cell._value = shift.formula(value, local)
+
+
+def insert_columns(ws, idx, amount=1):
+    """
+    Insert `amount` blank columns before column `idx` (1-based) of worksheet `ws` in one
+    shift of its cells. References into the moved columns are rewritten everywhere: formulas
+    on this and (when they name this sheet) other sheets, array formula ranges, merged
+    ranges, workbook / sheet defined names, conditional formats (ranges and rule formulas),
+    data validations, the auto-filter range and cell hyperlinks. Ranges that span the
+    insertion point grow, like Excel's Insert Columns.
+    """
+    shift = _ColumnShift(ws.title, idx, amount)
+
+    cells = {}
+    for (row, col), cell in ws._cells.items():
+        if col >= idx:
+            col += amount
+            cell.column = col
+            if cell.hyperlink is not None:
+                cell.hyperlink.ref = cell.coordinate
+        if cell.data_type == "f":
+            _rewrite_cell(cell, shift, local=True)
+        cells[(row, col)] = cell
+    ws._cells = cells
+
+    title = ws.title.lower()
+    for other in ws.parent.worksheets:
+        if other is ws:
+            continue
+        for cell in other._cells.values():
+            if cell.data_type == "f" and title in str(getattr(cell.value, "text", cell.value)).lower():
+                _rewrite_cell(cell, shift, local=False)
+
+    merged = list(ws.merged_cells.ranges)  # a set of ranges hashed on their bounds: rebuilt below
+    for mcr in merged:
+        if mcr.min_col >= idx:
+            mcr.shift(col_shift=amount)
+        elif mcr.max_col >= idx:
+            mcr.expand(right=amount)
+            for row in range(mcr.min_row, mcr.max_row + 1):  # the new columns join the merge
+                for col in range(idx, idx + amount):
+                    ws._cells[(row, col)] = MergedCell(ws, row=row, column=col)
+    ws.merged_cells.ranges = set(merged)
+
+    for names in (ws.parent.defined_names, ws.defined_names):
+        for defn in names.values():
+            if defn.value:
+                defn.value = shift.formula(defn.value, local=False)  # names are sheet-qualified
+
+    if ws.conditional_formatting:
+        old = ws.conditional_formatting
+        ws.conditional_formatting = ConditionalFormattingList()
+        for cf in old:
+            sqref = str(shift.ranges(cf.sqref))
+            for rule in cf.rules:
+                rule.formula = [shift.formula(f) for f in rule.formula]
+                ws.conditional_formatting.add(sqref, rule)
+        ws.conditional_formatting.max_priority = old.max_priority
+
+    for dv in ws.data_validations.dataValidation:
+        dv.sqref = shift.ranges(dv.sqref)
+        if dv.formula1:
+            dv.formula1 = shift.formula(dv.formula1)
+        if dv.formula2:
+            dv.formula2 = shift.formula(dv.formula2)
+
+    if ws.auto_filter.ref:
+        ws.auto_filter.ref = shift.ref(ws.auto_filter.ref)
+
+
+def rows_workbook(rows, first_row=1):
+    """
+    Write-only (streamed) workbook with one sheet, "Sheet", holding `rows` (sequences of
+    cell values; "=..." strings are formulas) from row `first_row` down. Save it once.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet")
+    for _ in range(first_row - 1):
+        ws.append([])
+    for row in rows:
+        ws.append(row)
+    return wb
@@ -1,261 +1,434 @@
-import streamlit as st
-import pandas as pd
 import math
-from io import BytesIO
-from openpyxl import load_workbook
+import os
+import tempfile
+import weakref
+import streamlit as st
+from order_engine import (
+    PDM_OPTIONS, SPLIT_MODES, MasterIndex, combine_order_lines, content_hash, expand_order_lines,
+    gender_mapping_from_frame, gender_misses, preview_table, quantity_issues,
+    read_excel_bytes, read_master_bytes, split_order_files
+)
+from diagnostics import StageTimer
+from label_proof import PROOF_FORMATS, write_label_proof
+from master_store import MasterStore, StoredMaster
+from template_writer import OrderTemplate, fill_template, write_order_zip
+from upc_index import UpcIndex, barcode_report, read_upc_bytes
 
 # ✅ Keep template in project folder (no upload needed)
 TEMPLATE_PATH = "Columbia Upload Excel Template_UPC_06182025 (1).xlsx"
 
-st.title("📦 UPC & Polybag Sticker Order Generator")
+# How many parsed uploads (master + gender) stay in memory before the least recently used is dropped
+PARSE_CACHE_SIZE = 8
+
+# Order lines per preview page
+PREVIEW_PAGE_SIZE = 500
+
+SPLIT_LABELS = {
+    None: "No split (one file per destination)",
+    "vendor": "One file per Vendor (AB Number)",
+    "po": "One file per PO Number",
+    "vendor+po": "One file per Vendor + PO Number",
+}
+
+
+# --- Parse cache: keyed on upload content hash, LRU-bounded, shared across reruns ---
+@st.cache_resource(max_entries=PARSE_CACHE_SIZE, show_spinner="Reading Excel...")
+def parse_upload(upload_hash, kind, _data):
+    """
+    Parsed DataFrame for an upload. `_data` is not hashed by Streamlit; the content
+    hash (plus reader kind) is the key. The frame is shared between reruns, so callers
+    must not mutate it. Master data goes through the column-pruned reader.
+    """
+    if kind == "master":
+        return read_master_bytes(_data)
+    return read_excel_bytes(_data)
+
+
+def read_upload(file, kind):
+    """Returns (content hash, parsed DataFrame) for an uploaded file."""
+    data = file.getvalue()
+    upload_hash = content_hash(data)
+    return upload_hash, parse_upload(upload_hash, kind, data)
+
+
+@st.cache_resource(max_entries=PARSE_CACHE_SIZE, show_spinner=False)
+def load_gender_mapping(upload_hash, _gender_df):
+    """Style → Gender lookup, built once per gender upload (raises ValueError on bad columns)."""
+    return gender_mapping_from_frame(_gender_df)
+
+
+@st.cache_resource(max_entries=PARSE_CACHE_SIZE, show_spinner=False)
+def index_master(upload_hash, _master_df):
+    """(Buy Date, last-4 style) → row positions, built once per master upload."""
+    return MasterIndex(_master_df)
+
+
+@st.cache_resource(max_entries=2, show_spinner="Indexing UPC master...")
+def load_upc_index(upload_hash, file_name, _data):
+    """UPC master parsed and hash-indexed once per upload (raises ValueError on bad columns)."""
+    return UpcIndex(read_upc_bytes(_data, file_name))
+
+
+# --- Local master store: files saved once, then queried per selection ---
+@st.cache_resource(show_spinner=False)
+def get_master_store():
+    return MasterStore()
+
+
+@st.cache_resource(max_entries=PARSE_CACHE_SIZE, show_spinner=False)
+def open_stored_master(upload_hash):
+    return StoredMaster(get_master_store(), upload_hash)
+
+
+def choose_master(timer):
+    """(content hash, MasterIndex / StoredMaster) for the master file in use, or (None, None)."""
+    store = get_master_store()
+    saved = store.uploads()
+    source = "Upload file"
+    if saved:
+        source = st.radio("Master Data source", ["Upload file", "Saved master store"], horizontal=True)
+
+    if source == "Saved master store":
+        choice = st.selectbox(
+            "Saved master file", saved,
+            format_func=lambda u: f"{u[1]} ({u[3]:,} rows, saved {u[2]})"
+        )
+        with timer.stage("open store"):
+            return choice[0], open_stored_master(choice[0])
 
-# --- Upload Master Data (mandatory) ---
-uploaded_file = st.file_uploader("Upload Master Data Excel", type=["xlsx"])
-if uploaded_file:
-    master_df = pd.read_excel(uploaded_file)
-    master_df.columns = master_df.columns.str.strip()
+    # --- Upload Master Data (mandatory) ---
+    uploaded_file = st.file_uploader("Upload Master Data Excel", type=["xlsx"])
+    if not uploaded_file:
+        return None, None
+    with timer.stage("read master"):
+        master_hash, master_df = read_upload(uploaded_file, "master")
     st.success("✅ Master Data uploaded successfully!")
 
+    for required in ("Buy Date", "JDE Style"):
+        if required not in master_df.columns:
+            st.error(f"❌ '{required}' column not found in Master Data")
+            st.stop()
+    with timer.stage("index"):
+        master_index = index_master(master_hash, master_df)
+
+    if store.has(master_hash):
+        st.caption("💾 This file is in the local master store; pick it under 'Saved master store' next time.")
+    elif st.button("💾 Save to local master store (no upload needed next time)"):
+        with st.spinner("Saving master data..."):
+            store.ingest(uploaded_file.getvalue(), uploaded_file.name, master_df)
+        st.rerun()
+    return master_hash, master_index
+
+
+# --- Per-style order lines: a selection change only expands the styles that were added ---
+@st.cache_resource(max_entries=1024, show_spinner=False)
+def style_order_lines(upload_hash, buy_date, style, pdm, gender_version, consolidate, upc_version,
+                      _master_index, _gender_mapping, _upc_index):
+    """Unsorted (USA/INT, JAPAN) lines for one style; shared read-only between reruns."""
+    rows = _master_index.rows(buy_date, [style])
+    return expand_order_lines(
+        rows, [style], pdm, _gender_mapping, consolidate=consolidate, upc_index=_upc_index
+    )
+
+
+# --- Per-style Quantity check, cached like the order lines ---
+@st.cache_resource(max_entries=1024, show_spinner=False)
+def style_quantity_issues(upload_hash, buy_date, style, _master_index):
+    """Non-numeric Quantity values of one style's master lines; shared read-only between reruns."""
+    return quantity_issues(_master_index.rows(buy_date, [style]))
+
+
+# --- Per-style gender check: master lines per JDE Style the gender master doesn't list ---
+@st.cache_resource(max_entries=1024, show_spinner=False)
+def style_gender_misses(upload_hash, buy_date, style, gender_version, _master_index, _gender_mapping):
+    """Unlisted JDE Style → line count for one style; shared read-only between reruns."""
+    return gender_misses(_master_index.rows(buy_date, [style]), _gender_mapping).to_dict()
+
+
+# --- Template cache: parsed once per process, re-parsed when the file's mtime changes ---
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_order_template(path, mtime):
+    """Shared read-only template; every download fills its own output buffer from it."""
+    return OrderTemplate(path)
+
+
+def get_order_template():
+    return load_order_template(TEMPLATE_PATH, os.path.getmtime(TEMPLATE_PATH))
+
+
+# --- Workbook memo: built only when a download is requested, once per exact selection ---
+@st.cache_data(max_entries=16, show_spinner="Building order form...")
+def build_order_workbook(selection_key, template_mtime, _df):
+    """`selection_key` identifies every input behind `_df` (uploads, buy date, styles, PDM, form)."""
+    return fill_template(get_order_template(), _df)
+
+
+class TempDownload:
+    """
+    A download written to a temp file instead of memory. The file is removed when the
+    object is dropped, e.g. when its st.cache_resource entry is evicted.
+    """
+
+    def __init__(self, suffix):
+        fd, self.path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+        weakref.finalize(self, _remove_file, self.path)
+
+    def open(self):
+        return open(self.path, "rb")
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# Split ZIPs and label proofs are spooled to disk and built in this process (workers=1),
+# like batch_orders.py; the cache keeps the temp file, not its bytes.
+@st.cache_resource(max_entries=4, show_spinner="Building split order forms...")
+def build_split_zip(selection_key, template_mtime, _forms, split_mode):
+    """ZIP of one filled template per form and split value, one workbook in memory at a time."""
+    archive = TempDownload(".zip")
+    write_order_zip(get_order_template(), split_order_files(_forms, SPLIT_MODES[split_mode]), archive.path, workers=1)
+    return archive
+
+
+@st.cache_resource(max_entries=4, show_spinner="Rendering label proof...")
+def build_label_proof(selection_key, _forms, proof_format):
+    """Every order line drawn as its sticker label, written page by page."""
+    proof = TempDownload(".pdf" if proof_format == "pdf" else ".zip")
+    with open(proof.path, "wb") as f:
+        write_label_proof(_forms, f, proof_format, workers=1)
+    return proof
+
+
+# --- Preview: typed Arrow table per selection, sent to the browser one page at a time ---
+@st.cache_resource(max_entries=16, show_spinner=False)
+def order_preview_table(form_key, _df):
+    return preview_table(_df)
+
+
+def show_preview(title, form_key, df):
+    st.subheader(title)
+    table = order_preview_table(form_key, df)
+    n_rows = table.num_rows
+    n_pages = max(1, math.ceil(n_rows / PREVIEW_PAGE_SIZE))
+    page = 1
+    if n_pages > 1:
+        # keyed on the selection so a new selection starts again at page 1
+        page = st.number_input(
+            f"Page (1–{n_pages})", min_value=1, max_value=n_pages, value=1,
+            key=f"page_{hash(form_key)}"
+        )
+    start = (page - 1) * PREVIEW_PAGE_SIZE
+    st.caption(f"Rows {min(start + 1, n_rows):,}–{min(start + PREVIEW_PAGE_SIZE, n_rows):,} of {n_rows:,}")
+    st.dataframe(table.slice(start, PREVIEW_PAGE_SIZE), hide_index=True)
+
+
+def mark_prepared(prepared_key, form_key):
+    st.session_state[prepared_key] = form_key
+
+
+def show_diagnostics(timer):
+    with st.expander("🩺 Diagnostics", expanded=True):
+        st.caption(f"Total {timer.total_seconds():.3f}s across {len(timer.stages)} stage(s)")
+        st.dataframe(timer.stages, hide_index=True)
+
+
+st.title("📦 UPC & Polybag Sticker Order Generator")
+
+# --- Optional stage timings (always logged; shown when Diagnostics is on) ---
+diagnostics_on = st.sidebar.checkbox("🩺 Show diagnostics")
+timer = StageTimer(trace_memory=diagnostics_on and st.sidebar.checkbox("Trace memory peak (slower)"))
+
+# --- Master Data: upload, or a file saved in the local master store ---
+master_hash, master_index = choose_master(timer)
+if master_index is not None:
     # --- Upload Gender Master Data (optional) ---
     gender_file = st.file_uploader("Upload Gender Master Data (Optional)", type=["xlsx"])
-    gender_mapping = {}
+    gender_mapping = None
+    gender_hash = None
     if gender_file:
-        gender_df = pd.read_excel(gender_file)
-        gender_df.columns = gender_df.columns.str.strip()
-
-        style_col = None
-        if "JDE Style" in gender_df.columns:
-            style_col = "JDE Style"
-        elif "Style" in gender_df.columns:
-            style_col = "Style"
-
-        if style_col and "Gender" in gender_df.columns:
-            gender_mapping = dict(zip(gender_df[style_col].astype(str), gender_df["Gender"]))
+        try:
+            with timer.stage("read gender"):
+                gender_hash, gender_df = read_upload(gender_file, "gender")
+                gender_mapping = load_gender_mapping(gender_hash, gender_df)
             st.success("✅ Gender Master Data uploaded successfully!")
-        else:
-            st.error("❌ Gender Master must have columns: 'Style/JDE Style' and 'Gender'")
+        except ValueError as e:
+            st.error(f"❌ {e}")
+
+    # --- Upload UPC Master (optional): fills Barcode / VDATA ---
+    upc_file = st.file_uploader("Upload UPC Master (Optional)", type=["xlsx", "csv"])
+    upc_index = None
+    upc_hash = None
+    if upc_file:
+        try:
+            with timer.stage("read UPC master"):
+                data = upc_file.getvalue()
+                upc_hash = content_hash(data)
+                upc_index = load_upc_index(upc_hash, upc_file.name, data)
+            summary = upc_index.summary()
+            bad = {k: v for k, v in summary.items() if k != "ok" and v}
+            st.success(f"✅ UPC Master loaded: {len(upc_index):,} style/color/size/inseam keys")
+            if bad:
+                st.warning("⚠️ UPC Master: " + " · ".join(f"{v:,} {k}" for k, v in bad.items()))
+        except ValueError as e:
+            st.error(f"❌ {e}")
 
     # --- Buy Date Dropdown ---
-    if "Buy Date" in master_df.columns:
-        buy_date_options = master_df["Buy Date"].dropna().unique().tolist()
-        selected_buy_date = st.selectbox("Select Buy Date", options=buy_date_options)
-        master_df = master_df[master_df["Buy Date"] == selected_buy_date]
-    else:
-        st.error("❌ 'Buy Date' column not found in Master Data")
-        st.stop()
+    selected_buy_date = st.selectbox("Select Buy Date", options=master_index.buy_dates)
 
     # --- Style Dropdown ---
-    if "JDE Style" in master_df.columns:
-        style_options = (
-            master_df["JDE Style"]
-            .dropna()
-            .astype(str)
-            .apply(lambda x: x[-4:])
-            .unique()
-            .tolist()
-        )
-        style_options.sort()
-        selected_styles = st.multiselect("Select Style Number(s) (last 4 digits)", options=style_options)
-    else:
-        st.error("❌ 'JDE Style' column not found in Master Data")
-        st.stop()
+    style_options = master_index.style_options(selected_buy_date)
+    selected_styles = st.multiselect("Select Style Number(s) (last 4 digits)", options=style_options)
 
     # --- PDM Dropdown (for USA/INT only) ---
-    pdm_options = ["071279", "073430", "096031", "121612", "122237", "123130"]
-    selected_pdm = st.selectbox("Select UPC PDM (USA/INT)", options=pdm_options)
+    selected_pdm = st.selectbox("Select UPC PDM (USA/INT)", options=PDM_OPTIONS)
 
-    # --- Sticker Qty Logic ---
-    def calculate_sticker_qty(qty):
-        try:
-            qty = int(qty)
-        except:
-            qty = 0
-        if qty < 50:
-            return qty + 2
-        else:
-            return math.ceil(qty * 1.02)
-
-    # --- Size order ---
-    size_order = (
-        [str(i) for i in range(2, 55)] +
-        ["XXS","XS","S","M","L","XL","XXL",
-         "1X","2X","3X","4X","5X","6X",
-         "LT","XLT","2XT","3XT","4XT","5XT","6XT"]
+    # --- Consolidation (off = one sticker pair per master line, as before) ---
+    consolidate = st.checkbox(
+        "Consolidate repeated lines (same PO, style, color, size, inseam: sum Quantity before overage)"
     )
 
-    def sort_by_size(df):
-        if "Size" in df.columns:
-            df["Size"] = pd.Categorical(df["Size"], categories=size_order, ordered=True)
-        if "Inseam" in df.columns:
-            df["Inseam"] = pd.Categorical(df["Inseam"], categories=size_order, ordered=True)
-        return df.sort_values(
-            by=["Item Number", "STYLE NUMBER", "COLOR NO", "Size", "Inseam"]
-        ).reset_index(drop=True)
-
-    # --- Prepare Output Rows ---
-    output_rows_normal = []
-    output_rows_japan = []
-
-    for _, row in master_df.iterrows():
-        style_full = str(row.get("JDE Style", ""))
-        style_last4 = style_full[-4:] if len(style_full) >= 4 else style_full
-        if style_last4 not in selected_styles:
-            continue
-
-        po = row.get("PO #", "")
-        color = str(row.get("Color", "")).zfill(3)   # ✅ Force 3-digit color code
-        size = str(row.get("F_Size", ""))            # ✅ Size now from F_Size
-        f_dm = str(row.get("f_DM", ""))              # ✅ Inseam always from f_DM
-        vendor = row.get("AB Number", "")
-        season = row.get("Season", "")
-        qty = row.get("Quantity", 0)
-        coo = row.get("Country of Origin", "")
-        country_full = str(row.get("Country", ""))
-
-        # ✅ COO normalization
-        if "india" in coo.lower():
-            coo = "India"
-        elif "bangladesh" in coo.lower():
-            coo = "Bangladesh"
-
-        # Destination mapping
-        if country_full.upper() == "UNITED STATES":
-            destination = "USA"
-        elif country_full.upper() == "JAPAN":
-            destination = "JAP"
-        else:
-            destination = "INT"
-
-        sticker_qty = calculate_sticker_qty(qty)
-        price = "YES" if destination == "USA" else "NO"
-
-        gender_choice = gender_mapping.get(style_full, "Unisex")
-
-        # --- Normal (USA/INT) ---
-        if destination in ["USA", "INT"]:
-            output_rows_normal.append({
-                "Item Number": selected_pdm,
-                "PO Number": po,
-                "Quantity": sticker_qty,
-                "Vendor": vendor,
-                "VDATA": "",
-                "DESTINATION": destination,
-                "SEASON CODE": season,
-                "STYLE NUMBER": style_full,
-                "COLOR NO": color,
-                "Barcode": "",
-                "Country of Origin": coo,
-                "GENDER": gender_choice,
-                "Size": size,
-                "Inseam": f_dm,
-                "Price": price
-            })
-            output_rows_normal.append({
-                "Item Number": "980010",
-                "PO Number": po,
-                "Quantity": sticker_qty,
-                "Vendor": vendor,
-                "VDATA": "",
-                "DESTINATION": destination,
-                "SEASON CODE": season,
-                "STYLE NUMBER": style_full,
-                "COLOR NO": color,
-                "Barcode": "",
-                "Country of Origin": coo,
-                "GENDER": gender_choice,
-                "Size": size,
-                "Inseam": f_dm,
-                "Price": "NO"
-            })
-
-        # --- Japan (separate file) ---
-        elif destination == "JAP":
-            # ✅ PDM 123138 → Price = YES
-            output_rows_japan.append({
-                "Item Number": "123138",   # Fixed UPC PDM for Japan
-                "PO Number": po,
-                "Quantity": sticker_qty,
-                "Vendor": vendor,
-                "VDATA": "",
-                "DESTINATION": destination,
-                "SEASON CODE": season,
-                "STYLE NUMBER": style_full,
-                "COLOR NO": color,
-                "Barcode": "",
-                "Country of Origin": coo,
-                "GENDER": gender_choice,
-                "Size": size,
-                "Inseam": f_dm,
-                "Price": "YES"
-            })
-            # ✅ Polybag stays NO
-            output_rows_japan.append({
-                "Item Number": "980010",   # Polybag fixed
-                "PO Number": po,
-                "Quantity": sticker_qty,
-                "Vendor": vendor,
-                "VDATA": "",
-                "DESTINATION": destination,
-                "SEASON CODE": season,
-                "STYLE NUMBER": style_full,
-                "COLOR NO": color,
-                "Barcode": "",
-                "Country of Origin": coo,
-                "GENDER": gender_choice,
-                "Size": size,
-                "Inseam": f_dm,
-                "Price": "NO"
-            })
-
-    # --- Convert to DataFrames ---
-    output_df_normal = pd.DataFrame(output_rows_normal)
-    output_df_normal = sort_by_size(output_df_normal)
-    output_df_normal.insert(0, "S.No", range(1, len(output_df_normal) + 1))
-
-    output_df_japan = pd.DataFrame(output_rows_japan)
-    if not output_df_japan.empty:
-        output_df_japan = sort_by_size(output_df_japan)
-        output_df_japan.insert(0, "S.No", range(1, len(output_df_japan) + 1))
+    # --- Prepare Output Rows (cached per style, then re-sorted and renumbered) ---
+    with timer.stage("expand", styles=len(selected_styles)):
+        style_parts = [
+            style_order_lines(
+                master_hash, selected_buy_date, style, selected_pdm, gender_hash, consolidate, upc_hash,
+                master_index, gender_mapping, upc_index
+            )
+            for style in dict.fromkeys(selected_styles)
+        ]
+    with timer.stage("sort"):
+        output_df_normal, output_df_japan = combine_order_lines(style_parts)
 
-    # --- Preview ---
-    st.subheader("Generated Order Form (Preview - USA/INT)")
-    st.dataframe(output_df_normal)
-
-    if not output_df_japan.empty:
-        st.subheader("Generated Order Form (Preview - JAPAN)")
-        st.dataframe(output_df_japan)
+    # --- Quantities that couldn't be read as numbers (ordered as 0 pcs + overage) ---
+    bad_qty = [
+        v
+        for style in dict.fromkeys(selected_styles)
+        for v in style_quantity_issues(master_hash, selected_buy_date, style, master_index).tolist()
+    ]
+    if bad_qty:
+        examples = ", ".join(list(dict.fromkeys(repr(v) for v in bad_qty))[:5])
+        st.warning(
+            f"⚠️ {len(bad_qty)} master line(s) have a blank, non-numeric or decimal-text Quantity ({examples}); "
+            "they were ordered as 0 pcs plus overage."
+        )
 
-    # --- Function to write into template ---
-    def generate_excel(df, filename):
-        wb = load_workbook(TEMPLATE_PATH)
-        ws = wb.active
+    # --- Styles the gender master doesn't list (defaulted to Unisex) ---
+    if gender_mapping is not None:
+        unlisted = {}
+        for style in dict.fromkeys(selected_styles):
+            unlisted.update(style_gender_misses(
+                master_hash, selected_buy_date, style, gender_hash, master_index, gender_mapping
+            ))
+        if unlisted:
+            st.info(
+                f"ℹ️ {sum(unlisted.values())} line(s) across {len(unlisted)} style(s) are not in the "
+                f"Gender Master and were set to Unisex: {', '.join(list(unlisted)[:5])}"
+                + (" …" if len(unlisted) > 5 else "")
+            )
 
-        start_row = 7
-        start_col = 2  # Column B
+    # --- Barcode check over the generated lines (UPC master loaded) ---
+    if upc_index is not None and not (output_df_normal.empty and output_df_japan.empty):
+        counts, problems = barcode_report([output_df_normal, output_df_japan])
+        if len(problems):
+            st.warning("⚠️ Barcodes: " + " · ".join(f"{v:,} {k}" for k, v in counts.items()))
+            with st.expander(f"Lines without a valid barcode ({len(problems):,})"):
+                st.dataframe(problems, hide_index=True)
 
-        for r_idx, row in df.iterrows():
-            for c_idx, value in enumerate(row, start=start_col):
-                ws.cell(row=start_row + r_idx, column=c_idx, value=row.iloc[c_idx - start_col])
+    # --- Preview ---
+    selection_key = (
+        master_hash, gender_hash, str(selected_buy_date), tuple(selected_styles), selected_pdm, consolidate,
+        upc_hash
+    )
+    with timer.stage("preview", rows=len(output_df_normal) + len(output_df_japan)):
+        show_preview("Generated Order Form (Preview - USA/INT)", selection_key + ("USA/INT",), output_df_normal)
 
-        buffer = BytesIO()
-        wb.save(buffer)
-        return buffer.getvalue()
+        if not output_df_japan.empty:
+            show_preview("Generated Order Form (Preview - JAPAN)", selection_key + ("JAPAN",), output_df_japan)
 
-    # --- Download buttons ---
-    if not output_df_normal.empty:
-        filled_file_normal = generate_excel(output_df_normal, "order_form_normal.xlsx")
+    # --- Download buttons (workbook built on request, then memoized for this selection) ---
+    downloads = [
+        ("USA/INT", output_df_normal, "filled_order_form_USA_INT.xlsx"),
+        ("JAPAN", output_df_japan, "filled_order_form_JAPAN.xlsx"),
+    ]
+    for form, df, file_name in downloads:
+        if df.empty:
+            continue
+        form_key = selection_key + (form,)
+        prepared_key = f"prepared_{form}"
+        if st.session_state.get(prepared_key) != form_key:
+            st.button(
+                f"⚙️ Prepare Order Form ({form})",
+                on_click=mark_prepared, args=(prepared_key, form_key)
+            )
+            continue
+        with timer.stage(f"generate_excel {form}", rows=len(df)):
+            workbook = build_order_workbook(form_key, os.path.getmtime(TEMPLATE_PATH), df)
         st.download_button(
-            label="📥 Download Order Form (USA/INT)",
-            data=filled_file_normal,
-            file_name="filled_order_form_USA_INT.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            label=f"📥 Download Order Form ({form})",
+            data=workbook,
+            file_name=file_name,
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            on_click="ignore"
         )
 
-    if not output_df_japan.empty:
-        filled_file_japan = generate_excel(output_df_japan, "order_form_japan.xlsx")
-        st.download_button(
-            label="📥 Download Order Form (JAPAN)",
-            data=filled_file_japan,
-            file_name="filled_order_form_JAPAN.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+    # --- Split export: one form per vendor and/or PO, bundled in a ZIP ---
+    split_mode = st.selectbox(
+        "Split export", options=list(SPLIT_LABELS), format_func=SPLIT_LABELS.get
+    )
+    has_lines = not (output_df_normal.empty and output_df_japan.empty)
+    if split_mode and has_lines:
+        split_key = selection_key + ("split", split_mode)
+        if st.session_state.get("prepared_split") != split_key:
+            st.button(
+                "⚙️ Prepare Split Order Forms (ZIP)",
+                on_click=mark_prepared, args=("prepared_split", split_key)
+            )
+        else:
+            forms = [("USA_INT", output_df_normal), ("JAPAN", output_df_japan)]
+            with timer.stage("generate_excel split", mode=split_mode):
+                archive = build_split_zip(split_key, os.path.getmtime(TEMPLATE_PATH), forms, split_mode)
+            with archive.open() as data:
+                st.download_button(
+                    label="📥 Download Split Order Forms (ZIP)",
+                    data=data,
+                    file_name=f"order_forms_by_{split_mode.replace('+', '_')}.zip",
+                    mime="application/zip",
+                    on_click="ignore"
+                )
+
+    # --- Label proof: the stickers as they'll print, to check before sending the order ---
+    proof_format = st.selectbox(
+        "Label proof", options=[None] + list(PROOF_FORMATS),
+        format_func=lambda fmt: PROOF_FORMATS.get(fmt, "No proof")
+    )
+    if proof_format and has_lines:
+        proof_key = selection_key + ("proof", proof_format)
+        if st.session_state.get("prepared_proof") != proof_key:
+            st.button(
+                f"⚙️ Prepare Label Proof ({PROOF_FORMATS[proof_format]})",
+                on_click=mark_prepared, args=("prepared_proof", proof_key)
+            )
+        else:
+            forms = [("USA/INT", output_df_normal), ("JAPAN", output_df_japan)]
+            with timer.stage("label proof", fmt=proof_format, labels=len(output_df_normal) + len(output_df_japan)):
+                proof = build_label_proof(proof_key, forms, proof_format)
+            with proof.open() as data:
+                st.download_button(
+                    label=f"📥 Download Label Proof ({PROOF_FORMATS[proof_format]})",
+                    data=data,
+                    file_name="label_proof.pdf" if proof_format == "pdf" else "label_proof_pages.zip",
+                    mime="application/pdf" if proof_format == "pdf" else "application/zip",
+                    on_click="ignore"
+                )
+
+    timer.log(
+        master=master_hash[:12], buy_date=selected_buy_date, styles=len(selected_styles),
+        pdm=selected_pdm, usa_int_lines=len(output_df_normal), japan_lines=len(output_df_japan)
+    )
+    if diagnostics_on:
+        show_diagnostics(timer)
@@ -0,0 +1,255 @@
+"""
+Headless batch run of the sticker order generator.
+
+    python batch_orders.py MASTER.xlsx [MASTER2.xlsx ...] --jobs jobs.json --out forms/
+
+jobs.json:
+
+    {
+      "gender_master": "Gender Master.xlsx",
+      "upc_master": "UPC Master.csv",
+      "jobs": [
+        {"buy_date": "2025-01-10", "styles": ["1234", "5678"], "pdm": "096031"},
+        {"buy_dates": ["2025-02-01", "2025-02-15"], "pdm": "121612"},
+        {"master": "MASTER2.xlsx", "buy_date": "2025-03-01", "pdm": "073430", "name": "spring"},
+        {"buy_date": "2025-01-10", "pdm": "096031", "split_by": "vendor", "consolidate": true},
+        {"buy_date": "2025-01-10", "pdm": "096031", "proof": "pdf"}
+      ]
+    }
+
+"gender_master" and "upc_master" (fills Barcode / VDATA) are optional. A job without
+"master" runs against every master file on the command line, one without "buy_date(s)"
+runs every buy date in the file, and one without "styles" takes every style of the buy
+date. "split_by" ("vendor", "po" or "vendor+po") writes one form per vendor / PO
+instead, bundled into a ZIP. "consolidate": true merges repeated PO / style / color /
+size / inseam lines before the overage, like the app's option. "proof" ("pdf" or "png")
+also writes a sticker-label proof of the job. Each (master, buy date, job) writes the
+USA/INT and (when there are Japan lines) JAPAN forms, with the same order lines, overage
+and sorting as the Streamlit app. Forms are built in parallel, one per worker.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
+
+from diagnostics import StageTimer
+from order_engine import (
+    PDM_OPTIONS, SPLIT_MODES, MasterIndex, build_order_frames, gender_mapping_from_frame, gender_misses,
+    quantity_issues, read_excel_bytes, read_master_bytes, safe_file_name,
+    split_order_files
+)
+from label_proof import PROOF_FORMATS, write_label_proof
+from template_writer import OrderTemplate, fill_template, write_order_zip
+from upc_index import UpcIndex, barcode_report, read_upc_bytes
+
+TEMPLATE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "Columbia Upload Excel Template_UPC_06182025 (1).xlsx"
+)
+
+# Per-worker state, set once by _init_worker
+_indexes = {}
+_gender_mapping = None
+_upc_index = None
+_template = None
+
+
+def _read_file(path, reader):
+    with open(path, "rb") as f:
+        return reader(f.read())
+
+
+def _init_worker(indexes, gender_mapping, upc_index, template_path):
+    global _indexes, _gender_mapping, _upc_index, _template
+    _indexes = indexes
+    _gender_mapping = gender_mapping
+    _upc_index = upc_index
+    _template = OrderTemplate(template_path)
+
+
+def _date_label(buy_date):
+    if isinstance(buy_date, (datetime, date)):
+        return buy_date.strftime("%Y-%m-%d")
+    return str(buy_date)
+
+
+def _match_buy_dates(index, wanted):
+    """Buy dates of a master matching the job's values ('2025-01-10' also matches a datetime)."""
+    if wanted is None:
+        return list(index.buy_dates)
+    wanted = {str(w) for w in wanted}
+    return [bd for bd in index.buy_dates if str(bd) in wanted or _date_label(bd) in wanted]
+
+
+def plan_tasks(jobs, indexes):
+    """
+    Expand the job spec into one task per (master, buy date, job):
+    (master path, buy date, styles, pdm, split mode, consolidate, proof format, output stem).
+    Raises ValueError on bad jobs.
+    """
+    tasks = []
+    stems = set()
+    for n, job in enumerate(jobs, start=1):
+        pdm = str(job.get("pdm", ""))
+        if pdm not in PDM_OPTIONS:
+            raise ValueError(f"Job {n}: PDM '{pdm}' is not one of {', '.join(PDM_OPTIONS)}")
+        split_by = job.get("split_by")
+        if split_by is not None and split_by not in SPLIT_MODES:
+            raise ValueError(f"Job {n}: split_by '{split_by}' is not one of {', '.join(SPLIT_MODES)}")
+        proof = job.get("proof")
+        if proof is not None and proof not in PROOF_FORMATS:
+            raise ValueError(f"Job {n}: proof '{proof}' is not one of {', '.join(PROOF_FORMATS)}")
+        if "master" in job:
+            paths = [os.path.abspath(job["master"])]
+            missing = [p for p in paths if p not in indexes]
+            if missing:
+                raise ValueError(f"Job {n}: master file {job['master']} was not given on the command line")
+        else:
+            paths = list(indexes)
+        wanted = job.get("buy_dates", [job["buy_date"]] if "buy_date" in job else None)
+
+        for path in paths:
+            index = indexes[path]
+            buy_dates = _match_buy_dates(index, wanted)
+            if not buy_dates:
+                print(f"⚠️ Job {n}: no matching buy date in {os.path.basename(path)}", file=sys.stderr)
+            for buy_date in buy_dates:
+                styles = job.get("styles") or index.style_options(buy_date)
+                stem = "_".join(safe_file_name(part) for part in (
+                    job.get("name") or os.path.splitext(os.path.basename(path))[0],
+                    _date_label(buy_date),
+                    pdm,
+                ))
+                if stem in stems:
+                    stem = f"{stem}_job{n}"
+                stems.add(stem)
+                tasks.append((
+                    path, buy_date, [str(s) for s in styles], pdm, split_by, bool(job.get("consolidate")),
+                    proof, stem
+                ))
+    return tasks
+
+
+def run_task(task, out_dir):
+    """Build and write one job's USA/INT and JAPAN forms; returns a summary dict."""
+    path, buy_date, styles, pdm, split_by, consolidate, proof, stem = task
+    timer = StageTimer()
+    with timer.stage("filter"):
+        rows = _indexes[path].rows(buy_date, styles)
+    with timer.stage("expand + sort"):
+        output_df_normal, output_df_japan = build_order_frames(
+            rows, styles, pdm, _gender_mapping, consolidate=consolidate, upc_index=_upc_index
+        )
+
+    forms = [("USA_INT", output_df_normal), ("JAPAN", output_df_japan)]
+    written = []
+    if split_by:
+        # jobs already run one per worker, so the split files are built in this process
+        out_path = os.path.join(out_dir, f"{stem}_by_{split_by.replace('+', '_')}.zip")
+        with timer.stage(f"generate_excel split {split_by}"):
+            write_order_zip(_template, split_order_files(forms, SPLIT_MODES[split_by]), out_path, workers=1)
+        written.append(out_path)
+    else:
+        for suffix, df in forms:
+            if df.empty:
+                continue
+            out_path = os.path.join(out_dir, f"{stem}_{suffix}.xlsx")
+            with timer.stage(f"generate_excel {suffix}", rows=len(df)), open(out_path, "wb") as f:
+                f.write(fill_template(_template, df))
+            written.append(out_path)
+
+    if proof:
+        out_path = os.path.join(out_dir, f"{stem}_proof.{'pdf' if proof == 'pdf' else 'zip'}")
+        with timer.stage(f"label proof {proof}"), open(out_path, "wb") as f:
+            write_label_proof(forms, f, proof, workers=1)
+        written.append(out_path)
+
+    return {
+        "master": os.path.basename(path),
+        "buy_date": _date_label(buy_date),
+        "pdm": pdm,
+        "styles": len(styles),
+        "usa_int_lines": len(output_df_normal),
+        "japan_lines": len(output_df_japan),
+        "bad_quantities": len(quantity_issues(rows)),
+        "unisex_defaults": 0 if _gender_mapping is None else int(gender_misses(rows, _gender_mapping).sum()),
+        "barcodes": None if _upc_index is None else barcode_report(df for _, df in forms)[0],
+        "files": written,
+        "seconds": timer.total_seconds(),
+        "stages": timer.stages,
+    }
+
+
+def run_batch(master_paths, jobs, out_dir, gender_path=None, workers=None, template_path=TEMPLATE_PATH,
+              upc_path=None):
+    """Run every job against the master files; yields one summary dict per finished task."""
+    indexes = {}
+    for path in master_paths:
+        df = _read_file(path, read_master_bytes)
+        for required in ("Buy Date", "JDE Style"):
+            if required not in df.columns:
+                raise ValueError(f"'{required}' column not found in {path}")
+        indexes[os.path.abspath(path)] = MasterIndex(df)
+
+    gender_mapping = None
+    if gender_path:
+        gender_mapping = gender_mapping_from_frame(_read_file(gender_path, read_excel_bytes))
+
+    upc_index = None
+    if upc_path:
+        with open(upc_path, "rb") as f:
+            upc_index = UpcIndex(read_upc_bytes(f.read(), upc_path))
+
+    tasks = plan_tasks(jobs, indexes)
+    os.makedirs(out_dir, exist_ok=True)
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker,
+        initargs=(indexes, gender_mapping, upc_index, template_path)
+    ) as pool:
+        futures = [pool.submit(run_task, task, out_dir) for task in tasks]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate UPC & polybag sticker order forms without the UI.")
+    parser.add_argument("masters", nargs="+", help="Master data .xlsx file(s)")
+    parser.add_argument("--jobs", required=True, help="Job spec JSON (see module docstring)")
+    parser.add_argument("--out", default="order_forms", help="Output folder (default: order_forms)")
+    parser.add_argument("--gender", help="Gender master .xlsx (overrides gender_master in the job spec)")
+    parser.add_argument("--upc", help="UPC master .xlsx/.csv (overrides upc_master in the job spec)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--template", default=TEMPLATE_PATH, help="Order form template .xlsx")
+    args = parser.parse_args(argv)
+
+    with open(args.jobs, encoding="utf-8") as f:
+        spec = json.load(f)
+    jobs = spec["jobs"] if isinstance(spec, dict) else spec
+    gender_path = args.gender or (spec.get("gender_master") if isinstance(spec, dict) else None)
+    upc_path = args.upc or (spec.get("upc_master") if isinstance(spec, dict) else None)
+
+    start = time.perf_counter()
+    count = 0
+    try:
+        for summary in run_batch(
+            args.masters, jobs, args.out, gender_path, args.workers, args.template, upc_path
+        ):
+            count += 1
+            print(json.dumps(summary))
+            if summary["bad_quantities"]:
+                print(
+                    f"⚠️ {summary['master']} {summary['buy_date']}: {summary['bad_quantities']} line(s) "
+                    "with a blank or non-numeric Quantity (ordered as 0 pcs + overage)",
+                    file=sys.stderr
+                )
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    print(f"✅ {count} job(s) done in {time.perf_counter() - start:.1f}s → {args.out}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""
+Benchmark of the order pipeline on synthetic master data.
+
+    python bench_orders.py                              # 1k, 10k, 100k, 1M rows
+    python bench_orders.py --sizes 1000,10000 --memory --out bench_results.json
+
+Each size gets a synthetic master workbook (kept in --data-dir, so later runs skip the
+slow xlsx generation), then parse, index, filter, expand, sort and template write are timed
+separately on one full buy date (every style of the busiest date). Results go to a JSON
+file together with the library versions, so runs can be compared.
+
+Parse dominates and grows linearly with the master: about 0.3 s per 1,000 rows here, so
+1k ≈ 0.3 s, 10k ≈ 3 s, 100k ≈ 30 s and 1M ≈ 5 min (plus a one-time xlsx generation the
+first time a size is used). --memory makes parsing about 5× slower under tracemalloc
+(10k ≈ 15 s), so sizes above --memory-max-rows (default 100k) run untraced; timings of
+a traced and an untraced run aren't comparable.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from openpyxl import Workbook
+
+from diagnostics import StageTimer
+from order_engine import (
+    MASTER_COLUMNS, PDM_OPTIONS, MasterIndex, expand_order_lines, finalize_order_frames,
+    read_master_bytes
+)
+from template_writer import OrderTemplate, fill_template
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+MEMORY_MAX_ROWS = 100_000  # tracemalloc above this would take the 1M run from minutes to ~half an hour
+TEMPLATE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "Columbia Upload Excel Template_UPC_06182025 (1).xlsx"
+)
+
+# Style families: (share of styles, sizes, size weights, inseams, inseam weights)
+STYLE_KINDS = [
+    ("tops", 0.45, ["XS", "S", "M", "L", "XL", "XXL"], [4, 14, 28, 28, 18, 8], [""], [1]),
+    ("bottoms", 0.30, [str(w) for w in range(28, 42, 2)], [5, 12, 20, 22, 20, 13, 8],
+     ["30", "32", "34"], [30, 50, 20]),
+    ("plus", 0.10, ["1X", "2X", "3X", "4X", "LT", "XLT", "2XT"], [30, 28, 18, 8, 8, 5, 3], [""], [1]),
+    ("youth", 0.15, ["XXS", "XS", "S", "M", "L", "XL"], [6, 14, 24, 26, 20, 10], ["", "REG"], [80, 20]),
+]
+COUNTRIES = (["UNITED STATES", "Japan", "Canada", "Germany", "United Kingdom", "Korea", "Chile"],
+             [55, 8, 12, 8, 7, 6, 4])
+ORIGINS = (["Vietnam", "Bangladesh", "India - Tirupur", "INDIA", "China", "Indonesia", "Cambodia"],
+           [34, 18, 8, 4, 16, 12, 8])
+SEASONS = (["F25", "S26", "F26"], [45, 40, 15])
+VENDORS = ["PPC", "EA0002", "V12345", "V20981", "V33310", "V40077"]
+
+
+def _weights(values):
+    w = np.asarray(values, dtype=float)
+    return w / w.sum()
+
+
+def make_master(n_rows, seed=0):
+    """
+    Synthetic master data with the columns the order form reads plus a few unused ones.
+    Styles follow a long-tail popularity curve; sizes, inseams, countries and quantities
+    follow per-family weights; ~1% of quantities are blank and ~0.2% are text.
+    """
+    rng = np.random.default_rng(seed)
+    n_styles = max(20, min(5000, n_rows // 150))
+    style_numbers = rng.choice(np.arange(1_000_000, 2_999_999), n_styles, replace=False)
+    style_kind = rng.choice(len(STYLE_KINDS), n_styles, p=_weights([k[1] for k in STYLE_KINDS]))
+    popularity = _weights(1.0 / (np.arange(n_styles) + 5))
+
+    n_dates = 12
+    buy_dates = pd.date_range("2025-01-06", periods=n_dates, freq="14D")
+    date_weights = _weights(rng.gamma(2.0, 1.0, n_dates))
+
+    style_idx = rng.choice(n_styles, n_rows, p=popularity)
+    kinds = style_kind[style_idx]
+    sizes = np.empty(n_rows, dtype=object)
+    inseams = np.empty(n_rows, dtype=object)
+    for k, (_, _, size_list, size_w, inseam_list, inseam_w) in enumerate(STYLE_KINDS):
+        rows = kinds == k
+        sizes[rows] = rng.choice(np.array(size_list, dtype=object), rows.sum(), p=_weights(size_w))
+        inseams[rows] = rng.choice(np.array(inseam_list, dtype=object), rows.sum(), p=_weights(inseam_w))
+
+    quantity = np.maximum(1, rng.lognormal(4.2, 1.1, n_rows).astype(np.int64)).astype(object)
+    quantity[rng.random(n_rows) < 0.01] = None
+    quantity[rng.random(n_rows) < 0.002] = "TBD"
+
+    return pd.DataFrame({
+        "Buy Date": buy_dates[rng.choice(n_dates, n_rows, p=date_weights)],
+        "JDE Style": style_numbers[style_idx],
+        "PO #": rng.integers(4_500_000, 4_600_000, n_rows),
+        "Color": rng.choice([10, 11, 12, 53, 100, 278, 464, 590, 711], n_rows),
+        "F_Size": sizes,
+        "f_DM": inseams,
+        "AB Number": rng.choice(VENDORS, n_rows),
+        "Season": rng.choice(SEASONS[0], n_rows, p=_weights(SEASONS[1])),
+        "Quantity": quantity,
+        "Country of Origin": rng.choice(ORIGINS[0], n_rows, p=_weights(ORIGINS[1])),
+        "Country": rng.choice(COUNTRIES[0], n_rows, p=_weights(COUNTRIES[1])),
+        "Description": rng.choice(["JACKET", "PANT", "SHIRT", "FLEECE", "SHORT"], n_rows),
+        "Unit Cost": rng.uniform(3, 60, n_rows).round(2),
+        "Ship Mode": rng.choice(["OCEAN", "AIR"], n_rows, p=[0.9, 0.1]),
+    })
+
+
+def write_master_xlsx(df, path):
+    """Write a synthetic master with openpyxl's write-only mode (plain cells, no styles)."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(list(df.columns))
+    for row in df.itertuples(index=False, name=None):
+        ws.append([None if isinstance(v, float) and np.isnan(v) else v for v in row])
+    wb.save(path)
+
+
+def synthetic_master_bytes(n_rows, seed, data_dir):
+    path = os.path.join(data_dir, f"master_{n_rows}_seed{seed}.xlsx")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        print(f"… generating {os.path.basename(path)}", file=sys.stderr)
+        write_master_xlsx(make_master(n_rows, seed), path + ".tmp")
+        os.replace(path + ".tmp", path)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def bench_size(n_rows, seed, data_dir, template, trace_memory=False):
+    """Time every pipeline stage once for one master size; returns the stage records."""
+    data = synthetic_master_bytes(n_rows, seed, data_dir)
+    timer = StageTimer(trace_memory=trace_memory)
+
+    with timer.stage("parse", columns=len(MASTER_COLUMNS)):
+        master_df = read_master_bytes(data)
+    with timer.stage("index"):
+        index = MasterIndex(master_df)
+    buy_date = max(index.buy_dates, key=lambda bd: sum(len(p) for p in index.partitions[bd].values()))
+    styles = index.style_options(buy_date)
+    with timer.stage("filter", styles=len(styles)):
+        rows = index.rows(buy_date, styles)
+    with timer.stage("expand", master_rows=len(rows)):
+        frames = expand_order_lines(rows, styles, PDM_OPTIONS[0], None)
+    with timer.stage("sort", order_lines=sum(len(df) for df in frames)):
+        frames = finalize_order_frames(frames)
+    for form, df in zip(("USA/INT", "JAPAN"), frames):
+        with timer.stage(f"template write {form}", order_lines=len(df)):
+            fill_template(template, df)
+
+    return [{"rows": n_rows, **record} for record in timer.stages]
+
+
+def run(sizes, seed=0, data_dir="bench_data", repeat=1, trace_memory=False, template_path=TEMPLATE_PATH,
+        memory_max_rows=MEMORY_MAX_ROWS):
+    """
+    Best-of-`repeat` timings per (size, stage) plus run metadata, as a JSON-ready dict.
+    With trace_memory, only sizes up to memory_max_rows are traced (their records carry peak_mb).
+    """
+    template = OrderTemplate(template_path)
+    results = []
+    for n_rows in sizes:
+        traced = trace_memory and n_rows <= memory_max_rows
+        if trace_memory and not traced:
+            print(f"{n_rows:>9,} rows  memory not traced (above --memory-max-rows {memory_max_rows:,})",
+                  file=sys.stderr)
+        runs = [bench_size(n_rows, seed, data_dir, template, traced) for _ in range(repeat)]
+        for stage_runs in zip(*runs):
+            best = min(stage_runs, key=lambda r: r["seconds"])
+            results.append(best)
+            print(f"{n_rows:>9,} rows  {best['stage']:<24} {best['seconds']:9.3f}s", file=sys.stderr)
+    return {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "openpyxl": openpyxl.__version__,
+            "seed": seed,
+            "repeat": repeat,
+            "trace_memory": trace_memory,
+            "memory_max_rows": memory_max_rows if trace_memory else None,
+        },
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the order pipeline on synthetic master data.")
+    parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES),
+                        help="Comma-separated master row counts (default: 1000,10000,100000,1000000)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per size; the fastest of each stage is kept")
+    parser.add_argument("--memory", action="store_true",
+                        help="Also record tracemalloc peaks (parsing gets about 5x slower)")
+    parser.add_argument("--memory-max-rows", type=int, default=MEMORY_MAX_ROWS,
+                        help=f"Largest size traced with --memory; larger ones run untraced (default: {MEMORY_MAX_ROWS})")
+    parser.add_argument("--data-dir", default="bench_data", help="Where synthetic master files are cached")
+    parser.add_argument("--out", default="bench_results.json", help="JSON results file")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    report = run(sizes, args.seed, args.data_dir, args.repeat, args.memory,
+                 memory_max_rows=args.memory_max_rows)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"✅ Results written to {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import json
+import logging
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# One JSON line per run; also appended to this file when ORDER_PERF_LOG is set
+PERF_LOG_ENV = "ORDER_PERF_LOG"
+
+logger = logging.getLogger("order_perf")
+if not logger.handlers:
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(logging.StreamHandler())
+    if os.environ.get(PERF_LOG_ENV):
+        logger.addHandler(logging.FileHandler(os.environ[PERF_LOG_ENV], encoding="utf-8"))
+
+
+class StageTimer:
+    """
+    Wall time (and, with trace_memory, the tracemalloc peak) of each named stage of a run.
+    Stages are flat: each one resets the peak, so don't nest them. Memory tracing slows
+    Python allocations noticeably, so it's opt-in.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name, **fields):
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = {"stage": name, "seconds": round(time.perf_counter() - start, 4)}
+            if self.trace_memory:
+                record["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+                if started_tracing:
+                    tracemalloc.stop()
+            record.update(fields)
+            self.stages.append(record)
+
+    def total_seconds(self):
+        return round(sum(s["seconds"] for s in self.stages), 4)
+
+    def log(self, **context):
+        """Write the run's stages as one structured (JSON) log line."""
+        logger.info(json.dumps({
+            "event": "order_run", "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            **context, "total_seconds": self.total_seconds(), "stages": self.stages,
+        }, default=str))
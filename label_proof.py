@@ -0,0 +1,282 @@
+"""
+Sticker-label proofs: every order line drawn as its UPC / polybag label (style, color,
+size, PO, quantity and the scannable barcode) on letter pages, written as a multi-page
+PDF or a ZIP of PNG pages, so the stickers can be checked before the order goes out.
+
+Barcode bars and text are rendered once per distinct value and pasted from a per-process
+tile cache; pages are rendered in a process pool and written in order as they arrive.
+"""
+import os
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from upc_index import UPC_OK, check_upc
+
+PROOF_FORMATS = {"pdf": "PDF", "png": "PNG pages (ZIP)"}
+
+DPI = 150
+PAGE_SIZE = (1275, 1650)     # US letter at DPI
+LABEL_SIZE = (375, 225)      # 2.5" x 1.5"
+MARGIN = 38                  # 1/4"
+GAP = 12
+FOOTER = 28                  # page title / page number strip
+MODULE = 2                   # px per barcode module (narrowest bar)
+BAR_HEIGHT = 62
+GUARD_EXTRA = 8              # guard bars reach into the digit line
+
+LABEL_COLUMNS = [
+    "Item Number", "PO Number", "Quantity", "DESTINATION", "STYLE NUMBER", "COLOR NO",
+    "Size", "Inseam", "GENDER", "Country of Origin", "Barcode"
+]
+
+# EAN-13 encoding (UPC-A is EAN-13 with a leading 0): L-code per digit, G = reversed R,
+# R = inverted L, and the L/G parity of the left half picked by the first digit
+_L_CODES = ["0001101", "0011001", "0010011", "0111101", "0100011",
+            "0110001", "0101111", "0111011", "0110111", "0001011"]
+_R_CODES = ["".join("1" if bit == "0" else "0" for bit in code) for code in _L_CODES]
+_G_CODES = [code[::-1] for code in _R_CODES]
+_PARITY = ["LLLLLL", "LLGLGG", "LLGGLG", "LLGGGL", "LGLLGG",
+           "LGGLLG", "LGGGLL", "LGLGLG", "LGLGGL", "LGGLGL"]
+
+
+def _columns_per_page():
+    width, height = PAGE_SIZE
+    cols = (width - 2 * MARGIN + GAP) // (LABEL_SIZE[0] + GAP)
+    rows = (height - 2 * MARGIN - FOOTER + GAP) // (LABEL_SIZE[1] + GAP)
+    return cols, rows
+
+
+def ean13_modules(code):
+    """Bar pattern of a 12/13-digit code as a '0'/'1' module string (95 modules)."""
+    code = code.zfill(13)
+    first, left, right = int(code[0]), code[1:7], code[7:]
+    bars = "101"
+    for parity, digit in zip(_PARITY[first], left):
+        bars += (_L_CODES if parity == "L" else _G_CODES)[int(digit)]
+    bars += "01010"
+    bars += "".join(_R_CODES[int(digit)] for digit in right)
+    return bars + "101"
+
+
+@lru_cache(maxsize=None)
+def _font(size):
+    return ImageFont.load_default(size)
+
+
+@lru_cache(maxsize=None)
+def _glyph(char, size):
+    """(ink mask, advance) of one character, drawn once per font size at full line height."""
+    font = _font(size)
+    ascent, descent = font.getmetrics()
+    right = font.getbbox(char, mode="1")[2]
+    mask = Image.new("L", (max(1, right), ascent + descent), 0)
+    draw = ImageDraw.Draw(mask)
+    draw.fontmode = "1"  # no anti-aliasing: pages are packed to 1 bit per pixel
+    draw.text((0, 0), char, font=font, fill=255)
+    return mask, round(font.getlength(char))
+
+
+@lru_cache(maxsize=20_000)
+def _text_tile(text, size):
+    """
+    Image of one text value, composed from cached glyph tiles (no kerning, which a proof
+    doesn't need); labels repeat styles, colors and POs heavily, so values are cached too.
+    """
+    glyphs = [_glyph(char, size) for char in text] or [_glyph(" ", size)]
+    width = sum(advance for _, advance in glyphs[:-1]) + max(glyphs[-1][0].width, glyphs[-1][1])
+    tile = Image.new("L", (max(1, width), glyphs[0][0].height), 255)
+    x = 0
+    for mask, advance in glyphs:
+        tile.paste(0, (x, 0, x + mask.width, mask.height), mask)
+        x += advance
+    return tile
+
+
+@lru_cache(maxsize=20_000)
+def _barcode_tile(code):
+    """Bars plus the human-readable digits of one valid UPC-A / EAN-13 code."""
+    modules = np.frombuffer(ean13_modules(code).encode("ascii"), dtype=np.uint8) - 48
+    guards = np.zeros(95, dtype=bool)
+    guards[[0, 1, 2, 45, 46, 47, 48, 49, 92, 93, 94]] = True
+    bars = np.repeat(modules.astype(bool), MODULE)
+    digits = _text_tile(code, 14)
+    height = BAR_HEIGHT + GUARD_EXTRA
+    pixels = np.full((height, bars.size), 255, dtype=np.uint8)
+    pixels[:BAR_HEIGHT, bars] = 0
+    pixels[BAR_HEIGHT:, bars & np.repeat(guards, MODULE)] = 0
+    tile = Image.new("L", (bars.size, height + digits.height - GUARD_EXTRA + 2), 255)
+    tile.paste(Image.fromarray(pixels), (0, 0))
+    tile.paste(digits, ((bars.size - digits.width) // 2, BAR_HEIGHT + 2))
+    return tile
+
+
+def proof_labels(df):
+    """One label tuple per order line (LABEL_COLUMNS as text + whether the barcode is valid)."""
+    text = df.reindex(columns=LABEL_COLUMNS).astype(object)
+    text = text.where(text.notna(), "").astype(str).replace({"nan": "", "None": ""})
+    valid = check_upc(text["Barcode"].to_numpy()) == UPC_OK
+    return list(zip(*(text[col].tolist() for col in LABEL_COLUMNS), valid.tolist()))
+
+
+def _draw_label(page, x, y, label):
+    item, po, qty, dest, style, color, size, inseam, gender, origin, barcode, valid = label
+    width, height = LABEL_SIZE
+    draw = ImageDraw.Draw(page)
+    draw.rectangle([x, y, x + width - 1, y + height - 1], outline=0)
+
+    page.paste(_text_tile(style, 24), (x + 10, y + 8))
+    qty_tile = _text_tile(f"x {qty}", 16)
+    page.paste(qty_tile, (x + width - 10 - qty_tile.width, y + 12))
+    size_text = f"Color {color}   Size {size}" + (f" / {inseam}" if inseam else "")
+    page.paste(_text_tile(size_text, 16), (x + 10, y + 40))
+    page.paste(_text_tile(" · ".join(v for v in (f"PO {po}", dest, gender) if v), 13), (x + 10, y + 62))
+
+    if valid:
+        tile = _barcode_tile(barcode)
+        page.paste(tile, (x + (width - tile.width) // 2, y + 86))
+    else:
+        draw.rectangle([x + 40, y + 92, x + width - 41, y + 160], outline=0, width=2)
+        warning = _text_tile(f"NO VALID UPC {barcode}".strip(), 16)
+        page.paste(warning, (x + (width - warning.width) // 2, y + 118))
+
+    page.paste(_text_tile(" · ".join(v for v in (f"Item {item}", origin) if v), 12), (x + 10, y + height - 22))
+
+
+def render_page(labels, title=""):
+    """
+    One page image with `labels` laid out row by row. Everything on it is pure black or
+    white; it's kept as 8-bit grayscale because pasting and exporting "L" images is much
+    faster in Pillow than bit-packed "1" images.
+    """
+    cols, _ = _columns_per_page()
+    page = Image.new("L", PAGE_SIZE, 255)
+    for n, label in enumerate(labels):
+        row, col = divmod(n, cols)
+        _draw_label(page, MARGIN + col * (LABEL_SIZE[0] + GAP), MARGIN + row * (LABEL_SIZE[1] + GAP), label)
+    if title:
+        page.paste(_text_tile(title, 14), (MARGIN, PAGE_SIZE[1] - MARGIN - 16))
+    return page
+
+
+def _render_encoded(task):
+    labels, title, fmt = task
+    page = render_page(labels, title)
+    pixels = np.frombuffer(page.tobytes(), dtype=np.uint8).reshape(PAGE_SIZE[1], PAGE_SIZE[0])
+    bits = np.packbits(pixels > 127, axis=1)  # 1-bit rows, 1 = white (as in PNG and DeviceGray)
+    if fmt == "png":
+        buffer = BytesIO()
+        Image.frombytes("1", PAGE_SIZE, bits.tobytes()).save(buffer, format="PNG", compress_level=3)
+        return buffer.getvalue()
+    return zlib.compress(bits.tobytes(), 3)
+
+
+def _page_tasks(named_frames, fmt):
+    cols, rows = _columns_per_page()
+    per_page = cols * rows
+    for name, df in named_frames:
+        labels = proof_labels(df)
+        n_pages = -(-len(labels) // per_page)
+        for page_no in range(n_pages):
+            title = f"{name} label proof - page {page_no + 1} of {n_pages} - {len(labels):,} labels"
+            yield labels[page_no * per_page:(page_no + 1) * per_page], title, fmt
+
+
+class _PdfWriter:
+    """Minimal PDF writer for full-page 1-bit images; pages are streamed to the file as added."""
+
+    def __init__(self, f):
+        self.f = f
+        self.position = 0
+        self.offsets = []
+        self.pages = []
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._reserve()  # 1: catalog, 2: page tree, written last
+        self._reserve()
+
+    def _write(self, data):
+        self.f.write(data)
+        self.position += len(data)
+
+    def _reserve(self):
+        self.offsets.append(None)
+        return len(self.offsets)
+
+    def _object(self, number, body, stream=None):
+        self.offsets[number - 1] = self.position
+        data = f"{number} 0 obj\n".encode() + body
+        if stream is not None:
+            data += b"\nstream\n" + stream + b"\nendstream"
+        self._write(data + b"\nendobj\n")
+
+    def add_page(self, width, height, flate_bits):
+        image, content, page = self._reserve(), self._reserve(), self._reserve()
+        self._object(image, (
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} /ColorSpace /DeviceGray "
+            f"/BitsPerComponent 1 /Filter /FlateDecode /Length {len(flate_bits)} >>"
+        ).encode(), flate_bits)
+        w_pt, h_pt = width * 72 / DPI, height * 72 / DPI
+        draw = f"q {w_pt:.2f} 0 0 {h_pt:.2f} 0 0 cm /Im Do Q".encode()
+        self._object(content, f"<< /Length {len(draw)} >>".encode(), draw)
+        self._object(page, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {w_pt:.2f} {h_pt:.2f}] "
+            f"/Resources << /XObject << /Im {image} 0 R >> >> /Contents {content} 0 R >>"
+        ).encode())
+        self.pages.append(page)
+
+    def close(self):
+        kids = " ".join(f"{page} 0 R" for page in self.pages)
+        self._object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>".encode())
+        self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref = self.position
+        entries = "".join(f"{offset:010d} 00000 n \n" for offset in self.offsets)
+        self._write((
+            f"xref\n0 {len(self.offsets) + 1}\n0000000000 65535 f \n{entries}"
+            f"trailer\n<< /Size {len(self.offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+        ).encode())
+
+
+def _encoded_pages(tasks, workers):
+    """Encoded pages in order; with more than one worker at most two per worker in flight."""
+    if workers <= 1:
+        for task in tasks:
+            yield _render_encoded(task)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(_render_encoded, task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def write_label_proof(named_frames, out, fmt="pdf", workers=None):
+    """
+    Render the labels of every (form name, frame) onto pages and write them to `out`
+    (binary file) as one PDF, or with fmt="png" as a ZIP with one PNG per page. Pages are
+    rendered in a process pool and written in order as they finish, so only the pages in
+    flight are held in memory. Returns the number of pages.
+    """
+    if fmt not in PROOF_FORMATS:
+        raise ValueError(f"Proof format '{fmt}' is not one of {', '.join(PROOF_FORMATS)}")
+    tasks = list(_page_tasks(named_frames, fmt))
+    pages = _encoded_pages(tasks, min(workers or os.cpu_count() or 1, len(tasks)))
+
+    if fmt == "pdf":
+        pdf = _PdfWriter(out)
+        for data in pages:
+            pdf.add_page(*PAGE_SIZE, data)
+        pdf.close()
+    else:
+        with zipfile.ZipFile(out, "w", zipfile.ZIP_STORED) as zf:  # PNGs are already deflated
+            for n, data in enumerate(pages, start=1):
+                zf.writestr(f"page_{n:05d}.png", data)
+    return len(tasks)
@@ -0,0 +1,197 @@
+"""
+Local SQLite store of ingested master files, so the app can query the rows for a
+selection instead of re-uploading and re-parsing the whole workbook every session.
+
+    python master_store.py ingest MASTER.xlsx [MORE.xlsx ...]
+    python master_store.py list
+
+Files are keyed by content hash (ingesting the same file twice is a no-op). Only the
+MASTER_COLUMNS the order form uses are kept, indexed on Buy Date (+ last-4 style),
+JDE Style and PO #.
+"""
+import json
+import os
+import sqlite3
+import sys
+import time
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from order_engine import MASTER_COLUMNS, content_hash, read_master_bytes, style_last4
+
+STORE_PATH = os.environ.get(
+    "ORDER_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "master_store.sqlite")
+)
+
+# Table column per master column (c0 = Buy Date, c1 = JDE Style, c2 = PO #, ...)
+_SQL_COLUMNS = {col: f"c{i}" for i, col in enumerate(MASTER_COLUMNS)}
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS uploads (
+    hash TEXT PRIMARY KEY,
+    name TEXT,
+    ingested_at TEXT,
+    rows INTEGER,
+    columns TEXT            -- JSON {{master column: "datetime" | "value"}}
+);
+CREATE TABLE IF NOT EXISTS master_rows (
+    upload_hash TEXT NOT NULL,
+    row_no INTEGER NOT NULL,
+    style_last4 TEXT,
+    {", ".join(_SQL_COLUMNS.values())},
+    PRIMARY KEY (upload_hash, row_no)
+);
+CREATE INDEX IF NOT EXISTS ix_rows_buy_date_style ON master_rows (upload_hash, c0, style_last4);
+CREATE INDEX IF NOT EXISTS ix_rows_jde_style ON master_rows (upload_hash, c1);
+CREATE INDEX IF NOT EXISTS ix_rows_po ON master_rows (upload_hash, c2);
+"""
+
+
+def _sql_value(value):
+    # Timestamps are stored as their str() text and turned back into datetimes on read
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return str(value)
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+class MasterStore:
+    """Ingest / list / query master files in one SQLite file (a connection per call)."""
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        with closing(self._connect()) as con:
+            con.executescript(_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+    def ingest(self, data, name, master_df=None):
+        """
+        Store a master file's rows unless the same content is already stored; returns its hash.
+        Pass master_df when the file was already parsed with read_master_bytes.
+        """
+        upload_hash = content_hash(data)
+        with closing(self._connect()) as con:
+            if con.execute("SELECT 1 FROM uploads WHERE hash = ?", (upload_hash,)).fetchone():
+                return upload_hash
+
+            df = read_master_bytes(data) if master_df is None else master_df
+            if "Buy Date" not in df.columns or "JDE Style" not in df.columns:
+                raise ValueError("Master Data must have 'Buy Date' and 'JDE Style' columns")
+            columns = [col for col in MASTER_COLUMNS if col in df.columns]
+            kinds = {col: "datetime" if df[col].dtype.kind == "M" else "value" for col in columns}
+
+            values = [range(len(df)), [_sql_value(v) for v in style_last4(df).tolist()]]
+            values += [[_sql_value(v) for v in df[col].astype(object).tolist()] for col in columns]
+            sql_cols = ", ".join(["row_no", "style_last4"] + [_SQL_COLUMNS[col] for col in columns])
+            with con:  # one transaction
+                con.executemany(
+                    f"INSERT INTO master_rows (upload_hash, {sql_cols}) VALUES (?, {', '.join('?' * len(values))})",
+                    ((upload_hash,) + row for row in zip(*values))
+                )
+                con.execute(
+                    "INSERT INTO uploads VALUES (?, ?, ?, ?, ?)",
+                    (upload_hash, name, time.strftime("%Y-%m-%d %H:%M"), len(df), json.dumps(kinds))
+                )
+        return upload_hash
+
+    def has(self, upload_hash):
+        with closing(self._connect()) as con:
+            return con.execute("SELECT 1 FROM uploads WHERE hash = ?", (upload_hash,)).fetchone() is not None
+
+    def uploads(self):
+        """[(hash, file name, ingested at, row count)], newest first."""
+        with closing(self._connect()) as con:
+            return con.execute(
+                "SELECT hash, name, ingested_at, rows FROM uploads ORDER BY ingested_at DESC, name"
+            ).fetchall()
+
+    def columns(self, upload_hash):
+        with closing(self._connect()) as con:
+            row = con.execute("SELECT columns FROM uploads WHERE hash = ?", (upload_hash,)).fetchone()
+        if row is None:
+            raise KeyError(upload_hash)
+        return json.loads(row[0])
+
+    def remove(self, upload_hash):
+        with closing(self._connect()) as con, con:
+            con.execute("DELETE FROM master_rows WHERE upload_hash = ?", (upload_hash,))
+            con.execute("DELETE FROM uploads WHERE hash = ?", (upload_hash,))
+
+
+class StoredMaster:
+    """
+    One stored master file with MasterIndex's interface (buy_dates, style_options, rows),
+    answered by indexed queries; only the selected rows are loaded into memory.
+    """
+
+    def __init__(self, store, upload_hash):
+        self.store = store
+        self.upload_hash = upload_hash
+        self.kinds = store.columns(upload_hash)
+        with closing(store._connect()) as con:
+            dates = con.execute(
+                "SELECT c0 FROM master_rows WHERE upload_hash = ? AND c0 IS NOT NULL "
+                "GROUP BY c0 ORDER BY MIN(row_no)", (upload_hash,)
+            ).fetchall()
+        self.buy_dates = self._restore("Buy Date", [d for (d,) in dates]).tolist()
+
+    def _restore(self, col, values):
+        if self.kinds.get(col) == "datetime":
+            return pd.Series(pd.to_datetime(values), dtype="datetime64[ns]")
+        values = pd.Series(values, dtype=object)
+        return values.where(values.notna(), np.nan)  # NULL → NaN, like a blank cell from the reader
+
+    def style_options(self, buy_date):
+        with closing(self.store._connect()) as con:
+            styles = con.execute(
+                "SELECT DISTINCT style_last4 FROM master_rows "
+                "WHERE upload_hash = ? AND c0 = ? AND style_last4 IS NOT NULL",
+                (self.upload_hash, _sql_value(buy_date))
+            ).fetchall()
+        return sorted(s for (s,) in styles)
+
+    def rows(self, buy_date, styles):
+        """Master rows for one buy date and a set of last-4 styles, in master order."""
+        styles = list(set(styles))
+        columns = list(self.kinds)
+        with closing(self.store._connect()) as con:
+            records = con.execute(
+                f"SELECT row_no, {', '.join(_SQL_COLUMNS[col] for col in columns)} FROM master_rows "
+                f"WHERE upload_hash = ? AND c0 = ? AND style_last4 IN ({', '.join('?' * len(styles))}) "
+                "ORDER BY row_no",
+                [self.upload_hash, _sql_value(buy_date)] + styles
+            ).fetchall() if styles else []
+        row_no = [r[0] for r in records]
+        df = pd.DataFrame({
+            col: self._restore(col, [r[i + 1] for r in records]) for i, col in enumerate(columns)
+        })
+        df.index = pd.Index(row_no, dtype="int64")
+        return df.infer_objects()
+
+
+def main(argv=None):
+    args = sys.argv[1:] if argv is None else argv
+    store = MasterStore()
+    if args[:1] == ["ingest"] and len(args) > 1:
+        for path in args[1:]:
+            with open(path, "rb") as f:
+                upload_hash = store.ingest(f.read(), os.path.basename(path))
+            print(f"✅ {path} → {upload_hash[:12]}")
+    elif args[:1] == ["list"]:
+        for upload_hash, name, ingested_at, rows in store.uploads():
+            print(f"{upload_hash[:12]}  {ingested_at}  {rows:>9,} rows  {name}")
+    else:
+        print(__doc__.strip())
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,595 @@
+import hashlib
+import re
+import time
+import tracemalloc
+from functools import lru_cache
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from openpyxl import load_workbook
+from pandas.io.parsers import TextParser
+
+# --- Fixed item numbers ---
+PDM_OPTIONS = ["071279", "073430", "096031", "121612", "122237", "123130"]
+JAPAN_PDM = "123138"      # Fixed UPC PDM for Japan
+POLYBAG_PDM = "980010"    # Polybag fixed
+
+# Master data columns the order form actually uses; everything else is skipped while parsing
+MASTER_COLUMNS = [
+    "Buy Date", "JDE Style", "PO #", "Color", "F_Size", "f_DM", "AB Number",
+    "Season", "Quantity", "Country of Origin", "Country"
+]
+CATEGORY_COLUMNS = ["Country", "Season", "Country of Origin"]
+
+# Excel error literals; pandas reads error cells as NaN
+EXCEL_ERRORS = {"#NULL!", "#DIV/0!", "#VALUE!", "#REF!", "#NAME?", "#NUM!", "#N/A"}
+
+# Quantity text is read like int() reads it: a whole number only ("10.5" or "1e3" as text isn't)
+_WHOLE_NUMBER_RE = re.compile(r"\s*[+-]?\d+\s*")
+
+# Column layout of the generated order form (S.No is added after sorting)
+OUTPUT_COLUMNS = [
+    "Item Number", "PO Number", "Quantity", "Vendor", "VDATA", "DESTINATION",
+    "SEASON CODE", "STYLE NUMBER", "COLOR NO", "Barcode", "Country of Origin",
+    "GENDER", "Size", "Inseam", "Price"
+]
+
+# --- Size order ---
+size_order = (
+    [str(i) for i in range(2, 55)] +
+    ["XXS","XS","S","M","L","XL","XXL",
+     "1X","2X","3X","4X","5X","6X",
+     "LT","XLT","2XT","3XT","4XT","5XT","6XT"]
+)
+
+# Rank of every alpha size in size_order; numeric sizes rank by value ahead of them
+SIZE_RANK = {size: rank for rank, size in enumerate(size_order)}
+_ALPHA_RANK = {size: rank for size, rank in SIZE_RANK.items() if not size.isdigit()}
+_NUMERIC_SIZE_RE = re.compile(r"^(\d+(?:\.\d+)?)([A-Z]*)$")        # 32, 10.5, 2T, 32L
+_COMBINED_SIZE_RE = re.compile(r"\s*(?:/|(?<=\d)\s*X\s*(?=\d))\s*")  # 32X30, M/T, 10/12
+_MISSING_SIZES = {"", "NAN", "NONE", "<NA>"}
+SORT_COLUMNS = ["Item Number", "STYLE NUMBER", "COLOR NO", "Size", "Inseam"]
+
+# Consolidation mode: order lines sharing these values are merged and their quantities summed
+CONSOLIDATE_KEYS = ["PO Number", "STYLE NUMBER", "COLOR NO", "Size", "Inseam", "DESTINATION"]
+
+# Split export: one order form per distinct value of these output columns
+SPLIT_MODES = {
+    "vendor": ["Vendor"],
+    "po": ["PO Number"],
+    "vendor+po": ["Vendor", "PO Number"],
+}
+
+# --- Sticker overage tiers ---
+# (applies below this quantity, multiplier, extra stickers); the first matching tier wins,
+# None = no upper bound. Stickers = ceil(qty * multiplier) + extra.
+DEFAULT_OVERAGE_TIERS = [
+    (50, 1.0, 2),      # under 50 pcs → +2
+    (None, 1.02, 0),   # 50 pcs and up → +2%, rounded up
+]
+# Per destination (USA / INT / JAP); edit a destination's list to give it its own rules.
+# A destination without tiers (missing, or an empty list) uses DEFAULT_OVERAGE_TIERS.
+OVERAGE_TIERS = {
+    "USA": DEFAULT_OVERAGE_TIERS,
+    "INT": DEFAULT_OVERAGE_TIERS,
+    "JAP": DEFAULT_OVERAGE_TIERS,
+}
+
+
+def content_hash(data):
+    """SHA-256 of an upload's bytes, used as the parse cache key."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def read_excel_bytes(data):
+    """Parse an uploaded xlsx (bytes) into a DataFrame with stripped column names."""
+    df = pd.read_excel(BytesIO(data))
+    df.columns = df.columns.str.strip()
+    return df
+
+
+def gender_mapping_from_frame(gender_df):
+    """
+    Gender per JDE Style from a parsed gender master ('JDE Style' or 'Style' column plus
+    'Gender'), as a Series indexed by the style text; a style listed twice keeps its last row.
+    Raises ValueError when those columns are missing.
+    """
+    style_col = None
+    if "JDE Style" in gender_df.columns:
+        style_col = "JDE Style"
+    elif "Style" in gender_df.columns:
+        style_col = "Style"
+
+    if not style_col or "Gender" not in gender_df.columns:
+        raise ValueError("Gender Master must have columns: 'Style/JDE Style' and 'Gender'")
+    styles = gender_df[style_col].astype(str).to_numpy()
+    mapping = pd.Series(gender_df["Gender"].to_numpy(), index=styles)
+    return mapping[~mapping.index.duplicated(keep="last")]
+
+
+def _gender_positions(style_full, gender_mapping):
+    # row position of each style in the gender master, -1 where it isn't listed
+    if gender_mapping is None or len(gender_mapping) == 0:
+        return np.full(len(style_full), -1, dtype=np.intp)
+    if not isinstance(gender_mapping, pd.Series):
+        gender_mapping = pd.Series(dict(gender_mapping), dtype=object)
+    return gender_mapping.index.get_indexer(style_full)
+
+
+def gender_misses(master_df, gender_mapping):
+    """Master line count per JDE Style that the gender master doesn't list (these get Unisex)."""
+    style_full = _text_column(master_df, "JDE Style")
+    missing = style_full[_gender_positions(style_full, gender_mapping) < 0]
+    return missing.value_counts(sort=False)
+
+
+def _excel_value(v):
+    # same conversions pandas' openpyxl reader applies per cell
+    if v is None:
+        return ""
+    if type(v) is float and v.is_integer():
+        return int(v)
+    if type(v) is str and v in EXCEL_ERRORS:
+        return np.nan
+    return v
+
+
+def _compact_dtypes(df):
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns and df[col].dtype == object:
+            df[col] = df[col].astype("category")
+    if "Quantity" in df.columns and df["Quantity"].dtype.kind == "i":
+        info = np.iinfo(np.int32)
+        if df["Quantity"].between(info.min, info.max).all():
+            df["Quantity"] = df["Quantity"].astype(np.int32)
+    return df
+
+
+def read_master_bytes(data, columns=MASTER_COLUMNS):
+    """
+    Column-pruned master reader. Sniffs the header row, keeps only `columns` while
+    streaming the sheet, then runs pandas' own type inference on what is left, so values
+    match pd.read_excel. Country/Season/COO become categoricals and Quantity int32.
+    Falls back to the full reader when none of the columns are in the header.
+    """
+    wb = load_workbook(BytesIO(data), read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        ws.reset_dimensions()
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        positions = {}
+        for i, name in enumerate(header):
+            if isinstance(name, str) and name.strip() in columns:
+                positions.setdefault(name.strip(), i)
+        if not positions:
+            return read_excel_bytes(data)
+        keep = sorted(positions.values())
+        width = keep[-1] + 1
+
+        table = [[_excel_value(header[i]) for i in keep]]
+        last_row_with_data = 0
+        for row in rows:
+            if len(row) < width:
+                row = row + (None,) * (width - len(row))
+            table.append([_excel_value(row[i]) for i in keep])
+            if row.count(None) != len(row):
+                last_row_with_data = len(table) - 1
+    finally:
+        wb.close()
+
+    # pandas keeps blank rows in the middle but drops trailing ones (of the full row)
+    del table[last_row_with_data + 1:]
+    df = TextParser(table, header=0, skip_blank_lines=False).read()
+    df.columns = df.columns.str.strip()
+    return _compact_dtypes(df)
+
+
+def _measure(reader, data):
+    start = time.perf_counter()
+    df = reader(data)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        reader(data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": round(seconds, 3),
+        "peak_mb": round(peak / 2**20, 1),
+        "frame_mb": round(float(df.memory_usage(deep=True).sum()) / 2**20, 1),
+        "columns": len(df.columns),
+    }
+
+
+def compare_master_readers(data):
+    """
+    Parse time, tracemalloc peak and resulting frame size of the full pd.read_excel
+    path vs read_master_bytes, plus the savings between them (absolute and in percent).
+
+    Both readers spend most of their time in openpyxl parsing the sheet XML, which pruning
+    can't skip, so the time saving is modest and grows with the unused columns. Measured:
+    a 20,000-row synthetic master (14 columns, 11 kept) parsed in 5.4-6.0 s instead of
+    6.5-6.8 s, about 15%; a 30,000-row master with 43 columns in 12.5-15 s instead of
+    17-22 s, about 30%. Single runs vary about as much, so compare several. Memory falls
+    more: frame 10.6 → 4.4 MB and tracemalloc peak 21.3 → 15.0 MB on the 20,000 rows.
+    """
+    full = _measure(read_excel_bytes, data)
+    pruned = _measure(read_master_bytes, data)
+    savings = {}
+    for key in ("seconds", "peak_mb", "frame_mb"):
+        savings[key] = round(full[key] - pruned[key], 3)
+        savings[f"{key}_pct"] = round(100 * savings[key] / full[key], 1) if full[key] else 0.0
+    return {"full": full, "pruned": pruned, "savings": savings}
+
+
+def _text_column(df, col):
+    """
+    Column as Python str values (same result as str(value) per cell).
+    Missing columns come back as empty strings.
+    """
+    if col not in df.columns:
+        return pd.Series("", index=df.index, dtype=object)
+    s = df[col]
+    if s.dtype.kind in "mM":
+        s = s.astype(object)  # keep str(Timestamp) formatting
+    return s.astype(str)
+
+
+def _size_column(df, col):
+    # Size / Inseam text for the form; a blank cell stays blank ("", not the text "nan"),
+    # e.g. the inseam of tops. size_sort_key sorts "" with the other missing sizes.
+    text = _text_column(df, col)
+    if col not in df.columns:
+        return text
+    return text.where(df[col].notna(), "")
+
+
+def _raw_column(df, col, default=""):
+    if col not in df.columns:
+        return pd.Series(default, index=df.index, dtype=object)
+    s = df[col]
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        s = s.astype(object)  # output keeps plain values
+    return s
+
+
+def _numeric_quantity(qty):
+    # like int(): numbers truncated toward zero, text only as a whole number; NaN where the
+    # value isn't a finite number
+    qty = pd.Series(qty)
+    if qty.dtype == object:
+        qty = qty.map(lambda v: None if isinstance(v, str) and not _WHOLE_NUMBER_RE.fullmatch(v) else v)
+    q = pd.to_numeric(qty, errors="coerce").to_numpy(dtype=float)
+    q[~np.isfinite(q)] = np.nan
+    return np.trunc(q)
+
+
+def check_overage_tiers(tiers):
+    """
+    Raise ValueError unless every tier list in `tiers` ({destination: tiers}) is a list of
+    (below, multiplier, extra) with increasing numeric bounds and None, if used, last.
+    """
+    for dest, dest_tiers in tiers.items():
+        bounds = []
+        for tier in dest_tiers:
+            if len(tier) != 3:
+                raise ValueError(f"Overage tier {tier!r} for {dest!r} is not (below, multiplier, extra)")
+            bounds.append(tier[0])
+        numeric = bounds[:-1] if bounds and bounds[-1] is None else bounds
+        if None in numeric or any(a >= b for a, b in zip(numeric, numeric[1:])):
+            raise ValueError(f"Overage tiers for {dest!r} need increasing bounds, None only last: {bounds!r}")
+
+
+check_overage_tiers({"default": DEFAULT_OVERAGE_TIERS, **OVERAGE_TIERS})  # a bad edit fails at import
+
+
+def calculate_sticker_qty(qty, destination=None, tiers=OVERAGE_TIERS):
+    """
+    Sticker quantity for a whole Quantity column, using the overage tiers of each line's
+    destination (DEFAULT_OVERAGE_TIERS for destinations not in `tiers` or without tiers).
+    Blank / non-numeric quantities are ordered as 0 pcs plus overage; see quantity_issues.
+    """
+    q = np.nan_to_num(_numeric_quantity(qty), nan=0.0)
+    if destination is None:
+        destination = np.full(len(q), "", dtype=object)
+    destination = np.asarray(destination, dtype=object)
+
+    stickers = np.zeros(len(q), dtype=np.int64)
+    for dest in pd.unique(destination):
+        rows = destination == dest
+        dest_q = q[rows]
+        conditions, values = [], []
+        for below, multiplier, extra in tiers.get(dest) or DEFAULT_OVERAGE_TIERS:
+            conditions.append(dest_q < below if below is not None else np.ones(len(dest_q), dtype=bool))
+            values.append(np.ceil(dest_q * multiplier) + extra)
+        stickers[rows] = np.select(conditions, values, default=dest_q)
+    return stickers
+
+
+def quantity_issues(master_df):
+    """
+    Quantity values that aren't read as numbers (blank, errors, text other than a whole
+    number such as "10.5"), indexed like master_df.
+    """
+    qty = _raw_column(master_df, "Quantity", None)
+    return qty[np.isnan(_numeric_quantity(qty))]
+
+
+def _size_part_key(part):
+    if part in _ALPHA_RANK:
+        return (1, float(_ALPHA_RANK[part]), "")
+    match = _NUMERIC_SIZE_RE.match(part)
+    if match:
+        return (0, float(match.group(1)), match.group(2))
+    return (2, 0.0, part)
+
+
+@lru_cache(maxsize=4096)
+def size_sort_key(size):
+    """
+    Sort key for one Size/Inseam value: numeric sizes by value, then size_order's alpha
+    sizes, then anything unrecognised (by text), then blanks. Combined sizes such as
+    "32x30" or "M/T" sort right after their first part, ordered by the second part.
+    """
+    text = str(size).strip().upper()
+    if text in _MISSING_SIZES:
+        return (3, 0.0, "", (0, 0.0, ""), text)
+    first, *rest = _COMBINED_SIZE_RE.split(text, maxsplit=1)
+    second = _size_part_key(rest[0]) if rest else (-1, 0.0, "")
+    return _size_part_key(first) + (second, text)
+
+
+def size_rank(values):
+    """Compact int32 rank codes for a Size/Inseam column (one key per distinct value)."""
+    codes, uniques = pd.factorize(pd.Series(values))
+    order = sorted(range(len(uniques)), key=lambda k: size_sort_key(uniques[k]))
+    ranks = np.empty(len(uniques) + 1, dtype=np.int32)
+    ranks[order] = np.arange(len(uniques), dtype=np.int32)
+    ranks[-1] = len(uniques)  # NA sentinel (-1) sorts last
+    return ranks[codes]
+
+
+def _text_rank(values):
+    codes, _ = pd.factorize(pd.Series(values), sort=True)
+    return np.where(codes < 0, codes.max(initial=0) + 1, codes)
+
+
+def sort_by_size(df):
+    """
+    Sort by Item Number, STYLE NUMBER, COLOR NO, Size, Inseam with one stable lexsort
+    over integer codes. Size/Inseam keep their original text.
+    """
+    keys = []
+    for col in reversed(SORT_COLUMNS):  # np.lexsort: last key is the primary one
+        if col not in df.columns:
+            continue
+        if col in ("Size", "Inseam"):
+            keys.append(size_rank(df[col]))
+        else:
+            keys.append(_text_rank(df[col]))
+    if not keys:
+        return df.reset_index(drop=True)
+    return df.take(np.lexsort(keys)).reset_index(drop=True)
+
+
+def style_last4(master_df):
+    """Last 4 characters of each JDE Style (what the style picker shows); NaN where blank."""
+    return _text_column(master_df, "JDE Style").str[-4:].where(master_df["JDE Style"].notna())
+
+
+class MasterIndex:
+    """
+    Row positions of a master frame partitioned by (Buy Date, last-4 JDE Style).
+    Built once per upload; selecting rows then costs O(selected rows), not O(file).
+    """
+
+    def __init__(self, master_df):
+        self.master_df = master_df
+        buy_date = master_df["Buy Date"]
+        last4 = style_last4(master_df)
+        self.buy_dates = buy_date.dropna().unique().tolist()
+
+        # {buy date: {style last4: row positions in master order}}
+        self.partitions = {}
+        groups = pd.DataFrame({"date": buy_date, "style": last4}).groupby(["date", "style"], sort=False).indices
+        for (date, style), positions in groups.items():
+            self.partitions.setdefault(date, {})[style] = positions
+
+    def style_options(self, buy_date):
+        return sorted(self.partitions.get(buy_date, {}))
+
+    def rows(self, buy_date, styles):
+        """Master rows for one buy date and a set of last-4 styles, in master order."""
+        by_style = self.partitions.get(buy_date, {})
+        parts = [by_style[s] for s in set(styles) if s in by_style]
+        positions = np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.intp)
+        return self.master_df.take(positions)
+
+
+def consolidate_lines(base):
+    """
+    Merge lines that share CONSOLIDATE_KEYS (same PO, style, color, size, inseam and
+    destination) into their first line, with Quantity summed; blank / non-numeric
+    quantities count as 0. Lines keep first-seen order.
+    """
+    qty = np.nan_to_num(_numeric_quantity(base["Quantity"]), nan=0.0)
+    base = base.assign(Quantity=qty)
+    base["Quantity"] = base.groupby(CONSOLIDATE_KEYS, sort=False, dropna=False)["Quantity"].transform("sum")
+    return base[~base.duplicated(CONSOLIDATE_KEYS)].reset_index(drop=True)
+
+
+def expand_order_lines(master_df, selected_styles, selected_pdm, gender_mapping,
+                       overage_tiers=OVERAGE_TIERS, consolidate=False, upc_index=None):
+    """
+    Expand master lines into sticker order lines as whole-column operations.
+    Every kept master line yields a UPC PDM row followed by a 980010 polybag row.
+    With consolidate, repeated lines are merged first (consolidate_lines) and the overage
+    is applied to the summed quantity. With a upc_index (upc_index.UpcIndex), Barcode and
+    VDATA are looked up per style / color / size / inseam; otherwise they stay blank.
+    Returns (USA/INT frame, JAPAN frame), unsorted, in master order.
+    """
+    style_full = _text_column(master_df, "JDE Style")
+    keep = style_full.str[-4:].isin(list(selected_styles)).to_numpy()
+    df = master_df[keep]
+    style_full = style_full[keep]
+
+    # ✅ COO normalization
+    coo = _raw_column(df, "Country of Origin").astype(object)
+    coo_lower = coo.astype(str).str.lower()
+    is_india = coo_lower.str.contains("india", regex=False)
+    is_bangladesh = coo_lower.str.contains("bangladesh", regex=False) & ~is_india
+    coo = coo.mask(is_india, "India").mask(is_bangladesh, "Bangladesh")
+
+    # Destination mapping
+    country = _text_column(df, "Country").str.upper()
+    destination = np.select(
+        [country == "UNITED STATES", country == "JAPAN"], ["USA", "JAP"], default="INT"
+    )
+
+    # Gender: one hash join against the gender master; unlisted styles → Unisex
+    positions = _gender_positions(style_full, gender_mapping)
+    gender = pd.Series("Unisex", index=df.index, dtype=object)
+    if (positions >= 0).any():
+        genders = np.asarray(pd.Series(gender_mapping).to_numpy(), dtype=object)
+        gender[positions >= 0] = genders[positions[positions >= 0]]
+
+    color = _text_column(df, "Color").str.zfill(3)   # ✅ Force 3-digit color code
+    size = _size_column(df, "F_Size")                 # ✅ Size now from F_Size
+    inseam = _size_column(df, "f_DM")                 # ✅ Inseam always from f_DM
+    barcode = vdata = ""
+    if upc_index is not None:
+        barcode, vdata = upc_index.lookup(style_full, color, size, inseam)
+
+    base = pd.DataFrame({
+        "PO Number": _raw_column(df, "PO #"),
+        "Quantity": _raw_column(df, "Quantity", None),
+        "Vendor": _raw_column(df, "AB Number"),
+        "VDATA": vdata,
+        "DESTINATION": destination,
+        "SEASON CODE": _raw_column(df, "Season"),
+        "STYLE NUMBER": style_full,
+        "COLOR NO": color,
+        "Barcode": barcode,
+        "Country of Origin": coo,
+        "GENDER": gender,
+        "Size": size,
+        "Inseam": inseam,
+    }, index=df.index).reset_index(drop=True)
+
+    if consolidate:
+        base = consolidate_lines(base)
+    destination = base["DESTINATION"].to_numpy()
+    base["Quantity"] = calculate_sticker_qty(base["Quantity"], destination, overage_tiers)
+
+    def pair_rows(rows, pdm, pdm_price):
+        upc = rows.assign(**{"Item Number": pdm, "Price": pdm_price})
+        polybag = rows.assign(**{"Item Number": POLYBAG_PDM, "Price": "NO"})
+        # stable sort on the shared index interleaves UPC/polybag per master line
+        paired = pd.concat([upc, polybag]).sort_index(kind="stable")
+        return paired[OUTPUT_COLUMNS].reset_index(drop=True).infer_objects()
+
+    # --- Normal (USA/INT) ---
+    normal = base[destination != "JAP"]
+    output_df_normal = pair_rows(normal, selected_pdm, np.where(normal["DESTINATION"] == "USA", "YES", "NO"))
+
+    # --- Japan (separate file) --- ✅ PDM 123138 → Price = YES, polybag stays NO
+    output_df_japan = pair_rows(base[destination == "JAP"], JAPAN_PDM, "YES")
+
+    return output_df_normal, output_df_japan
+
+
+def finalize_order_frames(frames):
+    """Size-sort and number (S.No) each non-empty order frame."""
+    result = []
+    for df in frames:
+        if not df.empty:
+            df = sort_by_size(df)
+            df.insert(0, "S.No", range(1, len(df) + 1))
+        result.append(df)
+    return tuple(result)
+
+
+def build_order_frames(master_df, selected_styles, selected_pdm, gender_mapping,
+                       overage_tiers=OVERAGE_TIERS, consolidate=False, upc_index=None):
+    """
+    Expand, size-sort and number the USA/INT and JAPAN order forms in one pass.
+    """
+    return finalize_order_frames(expand_order_lines(
+        master_df, selected_styles, selected_pdm, gender_mapping, overage_tiers, consolidate, upc_index
+    ))
+
+
+def combine_order_lines(parts):
+    """
+    Merge per-style (USA/INT, JAPAN) expansions into the final order forms.
+    Rows can only tie in the size sort within one style, and each part keeps master
+    order, so this matches expanding all selected styles at once.
+    """
+    frames = []
+    for k in range(2):
+        pieces = [part[k] for part in parts if not part[k].empty]
+        if pieces:
+            frames.append(pd.concat(pieces, ignore_index=True).infer_objects())
+        else:
+            frames.append(pd.DataFrame(columns=OUTPUT_COLUMNS))
+    return finalize_order_frames(frames)
+
+
+def safe_file_name(text):
+    """Text usable as (part of) a file name: runs of other characters become '_'."""
+    return re.sub(r"[^\w.-]+", "_", str(text)).strip("_")
+
+
+def split_order_files(forms, by):
+    """
+    (zip member name, order frame) per form and distinct value of the `by` columns, e.g.
+    "USA_INT/EA0002_4512345.xlsx". `forms` is [(folder, finalized frame), ...]; parts keep
+    the frame's sort order and are re-numbered from S.No 1. Blank values are named "blank".
+    """
+    for folder, df in forms:
+        if df.empty:
+            continue
+        used = set()
+        for key, part in df.groupby(by, sort=False, dropna=False):
+            stem = "_".join(
+                "blank" if pd.isna(value) else (safe_file_name(value) or "blank") for value in key
+            )
+            name = stem
+            n = 2
+            while name in used:  # distinct values that clean up to the same name
+                name = f"{stem}_{n}"
+                n += 1
+            used.add(name)
+            part = part.reset_index(drop=True)
+            part["S.No"] = np.arange(1, len(part) + 1)
+            yield f"{folder}/{name}.xlsx", part
+
+
+def preview_table(df):
+    """
+    Order lines as a typed Arrow table for the preview grid. Numeric columns keep their
+    dtype; object columns become Arrow strings/ints, and mixed-type ones (e.g. PO numbers
+    read as both int and text) are shown as text. Slicing the table for a page is zero-copy.
+    """
+    arrays = []
+    for col in df.columns:
+        s = df[col]
+        try:
+            arrays.append(pa.Array.from_pandas(s))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays.append(pa.Array.from_pandas(s.astype(str).where(s.notna())))
+    return pa.Table.from_arrays(arrays, names=[str(c) for c in df.columns])
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    # python order_engine.py MASTER.xlsx → parse-time / peak-memory report for the master readers
+    for path in sys.argv[1:]:
+        with open(path, "rb") as f:
+            print(path, json.dumps(compare_master_readers(f.read()), indent=2))
@@ -0,0 +1,283 @@
+import os
+import posixpath
+import re
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from io import BytesIO
+from math import isinf, isnan
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+import numpy as np
+from openpyxl import load_workbook
+from openpyxl.cell.cell import ERROR_CODES, ILLEGAL_CHARACTERS_RE
+from openpyxl.utils import column_index_from_string, get_column_letter
+from openpyxl.utils.exceptions import IllegalCharacterError
+
+# Data rows start at B7 in the Columbia template
+START_ROW = 7
+START_COL = 2
+
+_NS = {
+    "main": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+    "rel": "http://schemas.openxmlformats.org/package/2006/relationships",
+}
+_R_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+
+_ROW_RE = re.compile(r'<row\b[^>]*?\br="(\d+)"[^>]*?(?:/>|>.*?</row>)', re.S)
+_CELL_RE = re.compile(r'<c\b[^>]*?\br="([A-Z]+)\d+"[^>]*?(?:/>|>.*?</c>)', re.S)
+_STYLE_RE = re.compile(r'\bs="(\d+)"')
+_DIMENSION_RE = re.compile(r'<dimension ref="([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?"/>')
+
+_NUMERIC_TYPES = (int, float, Decimal, np.integer, np.floating)
+
+
+class UnsupportedValue(Exception):
+    """A value the streaming writer doesn't serialize (dates etc.); use the openpyxl path."""
+
+
+class OrderTemplate:
+    """
+    The order template split into the pieces the streaming writer needs: every zip part
+    as raw bytes, and the active sheet's XML cut into prefix / per-row cells / suffix.
+    Read-only once built: fill_template only reads it and builds each workbook in its
+    own buffer, so one cached instance can serve concurrent downloads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.raw = f.read()
+        with zipfile.ZipFile(BytesIO(self.raw)) as zf:
+            self.parts = tuple(
+                (info.filename, info.date_time, zf.read(info.filename)) for info in zf.infolist()
+            )
+            self.sheet_part = _active_sheet_part(zf)
+        sheet_xml = next(data for name, _, data in self.parts if name == self.sheet_part)
+        self._split_sheet(sheet_xml.decode("utf-8"))
+
+    def _split_sheet(self, xml):
+        if "<sheetData/>" in xml:
+            xml = xml.replace("<sheetData/>", "<sheetData></sheetData>", 1)
+        head_end = xml.index("<sheetData>") + len("<sheetData>")
+        tail_start = xml.index("</sheetData>")
+        self.prefix = xml[:head_end]
+        self.suffix = xml[tail_start:]
+
+        # row number -> (opening tag, [(column index, style attr, cell xml), ...])
+        self.rows = {}
+        body = xml[head_end:tail_start]
+        for match in _ROW_RE.finditer(body):
+            row_xml = match.group(0)
+            if row_xml.endswith("/>") and "</row>" not in row_xml:
+                open_tag, inner = row_xml[:-2] + ">", ""
+            else:
+                open_tag, inner = row_xml[:row_xml.index(">") + 1], row_xml[row_xml.index(">") + 1:-len("</row>")]
+            cells = []
+            for cell in _CELL_RE.finditer(inner):
+                style = _STYLE_RE.search(cell.group(0)[:cell.group(0).index(">")])
+                cells.append((
+                    column_index_from_string(cell.group(1)),
+                    f' s="{style.group(1)}"' if style else "",
+                    cell.group(0),
+                ))
+            self.rows[int(match.group(1))] = (open_tag, cells)
+        if body.count("<row") != len(self.rows):
+            raise ValueError("Template sheet has rows without an r= attribute")
+        self.max_row = max(self.rows, default=0)
+
+
+def _active_sheet_part(zf):
+    # workbook.xml activeTab → <sheet r:id> → workbook rels target, i.e. what openpyxl's wb.active is
+    workbook = ElementTree.fromstring(zf.read("xl/workbook.xml"))
+    view = workbook.find("main:bookViews/main:workbookView", _NS)
+    active = int(view.get("activeTab", 0)) if view is not None else 0
+    sheets = workbook.findall("main:sheets/main:sheet", _NS)
+    rel_id = sheets[active].get(_R_ID)
+    rels = ElementTree.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    for rel in rels.findall("rel:Relationship", _NS):
+        if rel.get("Id") == rel_id:
+            target = rel.get("Target")
+            if target.startswith("/"):
+                return target.lstrip("/")
+            return posixpath.normpath(posixpath.join("xl", target))
+    raise ValueError("Active sheet not found in template")
+
+
+def _cell_body(value):
+    """
+    Everything after `<c r=".." s=".."` for one value, following openpyxl's own
+    type rules (numbers as %.16g, NaN/inf blank, "=..." formulas, inline strings).
+    """
+    if value is None:
+        return "/>"
+    if isinstance(value, (bool, np.bool_)):
+        return f' t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, _NUMERIC_TYPES):
+        if isnan(value) or isinf(value):
+            return ' t="n"/>'
+        return f' t="n"><v>{"%.16g" % value}</v></c>'
+    if isinstance(value, str):
+        value = value[:32767]
+        if ILLEGAL_CHARACTERS_RE.search(value):
+            raise IllegalCharacterError(f"{value} cannot be used in worksheets.")
+        if value == "":
+            return ' t="inlineStr"/>'
+        if len(value) > 1 and value.startswith("="):
+            return f"><f>{escape(value[1:])}</f><v></v></c>"
+        if value in ERROR_CODES:
+            return f' t="e"><v>{value}</v></c>'
+        space = ' xml:space="preserve"' if value != value.strip() else ""
+        return f' t="inlineStr"><is><t{space}>{escape(value)}</t></is></c>'
+    raise UnsupportedValue(type(value).__name__)
+
+
+def _serialized_columns(df):
+    # one serialization per distinct (type, value) per column; order lines repeat a lot
+    columns = []
+    for col in df.columns:
+        memo = {}
+        bodies = []
+        for value in df[col].tolist():
+            key = (type(value), value)
+            try:
+                body = memo[key]
+            except KeyError:
+                body = memo[key] = _cell_body(value)
+            except TypeError:  # unhashable
+                body = _cell_body(value)
+            bodies.append(body)
+        columns.append(bodies)
+    return columns
+
+
+def _dimension(prefix, last_row, last_col):
+    match = _DIMENSION_RE.search(prefix)
+    if not match:
+        return prefix
+    first_col, first_row, end_col, end_row = match.groups()
+    end_col = end_col or first_col
+    end_row = int(end_row or first_row)
+    ref = "{}{}:{}{}".format(
+        first_col, first_row,
+        get_column_letter(max(column_index_from_string(end_col), last_col)),
+        max(end_row, last_row),
+    )
+    return prefix[:match.start()] + f'<dimension ref="{ref}"/>' + prefix[match.end():]
+
+
+def _sheet_chunks(template, df, start_row, start_col):
+    columns = _serialized_columns(df)
+    n_rows = len(df)
+    data_cols = range(start_col, start_col + len(columns))
+    last_row = start_row + n_rows - 1
+
+    yield _dimension(template.prefix, last_row, data_cols[-1] if columns else 0)
+    batch = []
+    for r in range(1, max(template.max_row, last_row) + 1):
+        i = r - start_row
+        has_data = 0 <= i < n_rows
+        if not has_data:
+            if r in template.rows:
+                open_tag, cells = template.rows[r]
+                batch.append(open_tag + "".join(c[2] for c in cells) + "</row>")
+        else:
+            open_tag, cells = template.rows.get(r, (f'<row r="{r}">', []))
+            styles = {}
+            parts = []
+            for col, style, xml in cells:
+                if col in data_cols:
+                    styles[col] = style
+                elif col < start_col:
+                    parts.append(xml)
+            for j, col in enumerate(data_cols):
+                parts.append(f'<c r="{get_column_letter(col)}{r}"{styles.get(col, "")}{columns[j][i]}')
+            parts.extend(xml for col, style, xml in cells if col > data_cols[-1])
+            batch.append(open_tag + "".join(parts) + "</row>")
+        if len(batch) >= 1000:
+            yield "".join(batch)
+            batch = []
+    yield "".join(batch)
+    yield template.suffix
+
+
+def fill_template(template, df, start_row=START_ROW, start_col=START_COL):
+    """
+    Write df into the template starting at (start_row, start_col) and return xlsx bytes.
+    Header rows, cell styles and every other part of the template are copied as-is;
+    data rows are streamed into the sheet XML in batches instead of built cell by cell.
+    Frames holding values the streaming writer doesn't handle go through openpyxl.
+    """
+    try:
+        chunks = _sheet_chunks(template, df, start_row, start_col)
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as out:
+            for name, date_time, data in template.parts:
+                if name == template.sheet_part:
+                    with out.open(name, "w") as sheet:
+                        for chunk in chunks:
+                            sheet.write(chunk.encode("utf-8"))
+                else:
+                    part = zipfile.ZipInfo(name, date_time=date_time)
+                    out.writestr(part, data, compress_type=zipfile.ZIP_DEFLATED)
+        return buffer.getvalue()
+    except UnsupportedValue:
+        return fill_template_openpyxl(template.raw, df, start_row, start_col)
+
+
+def fill_template_openpyxl(template_bytes, df, start_row=START_ROW, start_col=START_COL):
+    """Per-cell openpyxl writer (the original generate_excel path)."""
+    wb = load_workbook(BytesIO(template_bytes))
+    ws = wb.active
+    for r_idx, row in enumerate(df.itertuples(index=False, name=None)):
+        for c_idx, value in enumerate(row, start=start_col):
+            ws.cell(row=start_row + r_idx, column=c_idx, value=value)
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+_worker_template = None
+
+
+def _init_zip_worker(template):
+    global _worker_template
+    _worker_template = template
+
+
+def _fill_named(item):
+    name, df = item
+    return name, fill_template(_worker_template, df)
+
+
+def write_order_zip(template, named_frames, out, workers=None):
+    """
+    Fill the template for every (member name, frame) and write the workbooks into a zip
+    on `out` (path or binary file) in order, each as soon as it's built. With more than
+    one worker they're built in a process pool with at most two per worker in flight, so
+    only those workbooks are held in memory, never the whole set. xlsx files are already
+    deflated, so members are stored. Returns the number of files written.
+    """
+    named_frames = list(named_frames)
+    workers = min(workers or os.cpu_count() or 1, len(named_frames))
+    count = 0
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_STORED) as zf:
+        if workers <= 1:
+            for name, df in named_frames:
+                zf.writestr(name, fill_template(template, df))
+                count += 1
+            return count
+
+        with ProcessPoolExecutor(workers, initializer=_init_zip_worker, initargs=(template,)) as pool:
+            pending = deque()
+            for item in named_frames:
+                pending.append(pool.submit(_fill_named, item))
+                if len(pending) >= 2 * workers:
+                    zf.writestr(*pending.popleft().result())
+                    count += 1
+            while pending:
+                zf.writestr(*pending.popleft().result())
+                count += 1
+    return count
@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the order generator modules live at the top level, the BOM mapper's helpers in Bhagya/
+for path in (ROOT, os.path.join(ROOT, "Bhagya")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
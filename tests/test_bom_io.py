@@ -0,0 +1,61 @@
+from io import BytesIO
+
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+from bom_io import ReferenceIndex, sheet_frame, sheet_rows
+
+
+class _PublicOnly:
+    """A worksheet without openpyxl's private _cells, as another openpyxl release might have."""
+
+    def __init__(self, ws):
+        self._ws = ws
+
+    def __getattr__(self, name):
+        if name == "_cells":
+            raise AttributeError(name)
+        return getattr(self._ws, name)
+
+
+def _bom():
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["S.No", "MPN", "Manufacturer", "Qty", "Total"])
+    ws.append([1, "R1", "TI", 3, "=D2*2"])
+    ws.append([])
+    ws.append([3, "C1", None, 2.5, "=D4*2"])
+    data = BytesIO()
+    wb.save(data)
+    return load_workbook(BytesIO(data.getvalue()))
+
+
+def test_sheet_rows_without_private_cells():
+    wb = _bom()
+    ws = wb.active
+    for bounds in ((0, 2, 5), (2, 4, 3), (1, 9, 6)):
+        assert sheet_rows(_PublicOnly(ws), *bounds) == sheet_rows(ws, *bounds)
+    assert sheet_rows(ws, 0, 1, 2) == [[None, None], ["S.No", "MPN"]]
+    assert sheet_rows(ws, 4, 4, 5) == [[3, "C1", None, 2.5, "=D4*2"]]
+
+
+def test_sheet_frame_without_private_cells():
+    wb = _bom()
+    expected = sheet_frame(wb, wb.active, 1)
+    pd.testing.assert_frame_equal(sheet_frame(wb, _PublicOnly(wb.active), 1), expected)
+
+
+def test_reference_index_first_row_wins():
+    # each row claims its MPN, then its Alternate; a key keeps the first claim
+    old = pd.DataFrame({
+        "MPN": ["R1", "C1", "r1", None, "U1"],
+        "Alternate": ["C1", "R2", None, "X9", ""],
+        "Supplier": ["a", "b", "c", "d", "e"],
+    })
+    reference = ReferenceIndex(old, "MPN", "Alternate", {"Supplier": "Supplier"})
+    assert len(reference) == 5  # R1, C1, R2, r1, U1 (no MPN: X9 skipped; blank Alternate skipped)
+    found = reference.lookup(["R1", "C1", "R2", "r1", "X9", None, " U1 "])
+    assert [m and m["Supplier"] for m in found] == ["a", "a", "b", "c", None, None, "e"]
+
+    lower = ReferenceIndex(old, "MPN", "Alternate", {"Supplier": "Supplier"}, lower=True)
+    assert [m["Supplier"] for m in lower.lookup(["r1", "R1", "c1"])] == ["a", "a", "a"]
@@ -0,0 +1,86 @@
+from io import BytesIO
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.formatting.rule import CellIsRule
+from openpyxl.workbook.defined_name import DefinedName
+from openpyxl.worksheet.datavalidation import DataValidation
+from openpyxl.worksheet.formula import ArrayFormula
+
+from bom_sheet import insert_columns, rows_workbook
+
+
+def _sheet():
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "BOM"
+    ws.append(["MPN", "Qty", "Price", "Total"])
+    ws.append(["R1", 3, 0.5, "=B2*C2"])
+    ws.append(["C1", 2, 1.5, "=B3*C3"])
+    ws["E2"] = '=SUM(B2:D2)&"A1"&$C$2'
+    ws["F2"] = ArrayFormula("F2:F3", "=B2:B3*2")
+    return wb, ws
+
+
+def test_insert_columns_moves_cells_and_formulas():
+    wb, ws = _sheet()
+    insert_columns(ws, 2, 2)
+    assert [c.value for c in ws[1]][:6] == ["MPN", None, None, "Qty", "Price", "Total"]
+    assert ws["F2"].value == "=D2*E2"
+    assert ws["F3"].value == "=D3*E3"
+    # a range spanning the insertion grows; string literals are left alone
+    assert ws["G2"].value == '=SUM(D2:F2)&"A1"&$E$2'
+    assert ws["H2"].value.ref == "H2:H3"
+    assert ws["H2"].value.text == "=D2:D3*2"
+
+
+def test_insert_columns_left_of_the_insertion_is_untouched():
+    wb, ws = _sheet()
+    insert_columns(ws, 4)
+    assert ws["E2"].value == "=B2*C2"
+    assert ws["F2"].value == '=SUM(B2:E2)&"A1"&$C$2'
+
+
+def test_insert_columns_rewrites_sheet_references():
+    wb, ws = _sheet()
+    other = wb.create_sheet("Summary")
+    other["A1"] = "=SUM(BOM!D2:D3)+'BOM'!$B$2+C5"  # C5 is on Summary itself
+    wb.defined_names["Totals"] = DefinedName("Totals", attr_text="BOM!$D$2:$D$3")
+    insert_columns(ws, 2)
+    assert other["A1"].value == "=SUM(BOM!E2:E3)+'BOM'!$C$2+C5"
+    assert wb.defined_names["Totals"].attr_text == "BOM!$E$2:$E$3"
+
+
+def test_insert_columns_merges_validations_and_formats():
+    wb, ws = _sheet()
+    ws.merge_cells("A5:C5")
+    ws.merge_cells("C6:D6")
+    dv = DataValidation(type="list", formula1="$B$2:$B$3")
+    dv.add("C2:C3")
+    ws.add_data_validation(dv)
+    ws.conditional_formatting.add("D2:D3", CellIsRule(operator="greaterThan", formula=["$C$2"]))
+    ws.auto_filter.ref = "A1:D3"
+
+    insert_columns(ws, 2)
+    assert sorted(str(r) for r in ws.merged_cells.ranges) == ["A5:D5", "D6:E6"]
+    assert str(dv.sqref) == "D2:D3"
+    assert dv.formula1 == "$C$2:$C$3"
+    (cf,) = ws.conditional_formatting
+    assert str(cf.sqref) == "E2:E3"
+    assert cf.rules[0].formula == ["$D$2"]
+    assert ws.auto_filter.ref == "A1:E3"
+
+    # the result saves and reloads with the shifted values
+    data = BytesIO()
+    wb.save(data)
+    reloaded = load_workbook(BytesIO(data.getvalue()))["BOM"]
+    assert reloaded["E2"].value == "=C2*D2"
+    assert str(reloaded.merged_cells) == str(ws.merged_cells)
+
+
+def test_rows_workbook_starts_at_first_row():
+    wb = rows_workbook(iter([["MPN", "Total"], ["R1", "=A2&1"]]), first_row=3)
+    data = BytesIO()
+    wb.save(data)
+    ws = load_workbook(BytesIO(data.getvalue()))["Sheet"]
+    assert ws.max_row == 4
+    assert [[c.value for c in row] for row in ws.iter_rows(min_row=3)] == [["MPN", "Total"], ["R1", "=A2&1"]]
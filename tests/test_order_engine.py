@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from order_engine import calculate_sticker_qty, check_overage_tiers, quantity_issues
+
+
+def test_text_quantity_must_be_a_whole_number():
+    # int("10.5") fails, so decimal text is ordered as 0 pcs (+2) and reported; a 10.5 number truncates
+    qty = pd.Series(["10.5", 10.5, "10", " 12 ", "1e3"], dtype=object)
+    assert calculate_sticker_qty(qty).tolist() == [2, 12, 12, 14, 2]
+    assert quantity_issues(pd.DataFrame({"Quantity": qty})).tolist() == ["10.5", "1e3"]
+
+
+def test_default_tiers():
+    # under 50 pcs: +2; from 50 up: +2% rounded up (49 → 51, 50 → 51, 51 → ceil(52.02) = 53)
+    qty = pd.Series([0, 1, 49, 50, 51, 100, 101, 1000])
+    assert calculate_sticker_qty(qty).tolist() == [2, 3, 51, 51, 53, 102, 104, 1020]
+
+
+def test_tiers_per_destination():
+    tiers = {"USA": [(10, 1.0, 5), (100, 1.0, 3), (None, 1.5, 0)]}
+    qty = pd.Series([9, 10, 99, 100, 9, 100])
+    dest = ["USA", "USA", "USA", "USA", "JAP", "JAP"]
+    assert calculate_sticker_qty(qty, dest, tiers=tiers).tolist() == [14, 13, 102, 150, 11, 102]
+
+
+def test_destination_without_tiers_uses_the_default():
+    qty = pd.Series([10, 100])
+    default = calculate_sticker_qty(qty, ["USA", "USA"]).tolist()
+    assert calculate_sticker_qty(qty, ["USA", "USA"], tiers={"USA": []}).tolist() == default == [12, 102]
+
+
+@pytest.mark.parametrize("tiers", [
+    {"USA": [(50, 1.0)]},                         # not (below, multiplier, extra)
+    {"USA": [(100, 1.0, 2), (50, 1.0, 1)]},       # bounds not increasing
+    {"USA": [(None, 1.02, 0), (50, 1.0, 2)]},     # None before the last tier
+])
+def test_bad_tier_tables_are_rejected(tiers):
+    with pytest.raises(ValueError):
+        check_overage_tiers(tiers)
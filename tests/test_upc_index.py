@@ -0,0 +1,33 @@
+import numpy as np
+
+from upc_index import UPC_BAD_CHECK, UPC_MALFORMED, UPC_MISSING, UPC_OK, check_upc, normalize_upc
+
+
+def test_check_upc():
+    codes = [
+        "036000291452",   # UPC-A
+        "036000291453",   # UPC-A, wrong check digit
+        "4006381333931",  # EAN-13
+        "4006381333932",  # EAN-13, wrong check digit
+        "0000000000000",  # all zeros: check digit 0
+        "36000291452",    # 11 digits (not normalized)
+        "03600029145A",
+        "",
+        None,
+    ]
+    assert check_upc(codes).tolist() == [
+        UPC_OK, UPC_BAD_CHECK, UPC_OK, UPC_BAD_CHECK, UPC_OK,
+        UPC_MALFORMED, UPC_MALFORMED, UPC_MISSING, UPC_MISSING,
+    ]
+    assert check_upc([]).tolist() == []
+
+
+def test_normalize_upc_pads_only_11_digits():
+    # Excel drops a UPC-A's leading zero; other lengths are left for check_upc to report
+    assert normalize_upc(np.array([36000291452, 4006381333931, 12345])).tolist() == [
+        "036000291452", "4006381333931", "12345",
+    ]
+    assert normalize_upc([36000291452.0, " 036000291452 ", "36000291452.0", "nan", None, 1234.5]).tolist() == [
+        "036000291452", "036000291452", "036000291452", "", "", "1234.5",
+    ]
+    assert check_upc(normalize_upc([36000291452])).tolist() == [UPC_OK]
@@ -0,0 +1,160 @@
+"""
+UPC master lookup for the Barcode / VDATA columns, plus UPC-A / EAN-13 check-digit
+validation done on whole columns at once.
+"""
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from order_engine import read_master_bytes
+
+# Accepted header names per key, first match wins
+UPC_KEY_COLUMNS = {
+    "style": ["JDE Style", "Style", "STYLE NUMBER"],
+    "color": ["Color", "COLOR NO", "Color Code"],
+    "size": ["F_Size", "Size"],
+    "inseam": ["f_DM", "Inseam", "Dim"],
+    "upc": ["UPC", "Barcode", "EAN", "UPC Code"],
+}
+VDATA_COLUMNS = ["VDATA"]
+_MISSING = {"", "NAN", "NONE", "<NA>", "NAT"}
+
+# Check-digit status per barcode
+UPC_OK = "ok"
+UPC_BAD_CHECK = "check digit mismatch"
+UPC_MALFORMED = "not 12/13 digits"
+UPC_MISSING = "no UPC"
+
+
+def _key_text(values):
+    # same text the order lines carry (str(value)), trimmed and upper-cased; blanks → "",
+    # and whole numbers that came through as floats ("1234567.0") lose the ".0".
+    # Normalized once per distinct value; key columns repeat heavily.
+    values = pd.Series(values)
+    if values.dtype.kind in "iu":
+        return values.astype(str).astype(object).reset_index(drop=True)
+    codes, uniques = pd.factorize(values.to_numpy(dtype=object))
+    text = pd.Series(uniques, dtype=object).astype(str).str.strip().str.upper()
+    text = text.str.replace(r"^(\d+)\.0$", r"\1", regex=True)
+    text = text.where(~text.isin(_MISSING), "")
+    return pd.Series(np.append(text.to_numpy(dtype=object), "")[codes], dtype=object)  # -1 (NaN) → ""
+
+
+def line_keys(style, color, size, inseam):
+    """One 'style|color|size|inseam' key per line; color is compared as a 3-digit code."""
+    color = _key_text(color)
+    color = color.str.zfill(3).where(color != "", "")
+    return _key_text(style).str.cat([color, _key_text(size), _key_text(inseam)], sep="|").to_numpy()
+
+
+def normalize_upc(values):
+    """
+    UPC / EAN text per value. Excel keeps UPCs as numbers and drops a UPC-A's leading
+    zero, so 11-digit values (also "….0" floats) are re-padded to 12; any other length is
+    kept as is, so check_upc reports it. Blanks become "".
+    """
+    values = pd.Series(values)
+    if values.dtype.kind in "iu":  # all numbers: no text cleanup needed
+        text = values.astype(str)
+        return text.where(text.str.len() != 11, "0" + text).to_numpy(dtype=object)
+    text = values.astype(object).astype(str).str.strip()
+    text = text.str.replace(r"^(\d+)\.0$", r"\1", regex=True)
+    text = text.where(~text.str.fullmatch(r"\d{11}"), "0" + text)
+    return text.where(~text.str.upper().isin(_MISSING), "").to_numpy(dtype=object)
+
+
+def check_upc(values):
+    """
+    Check-digit status for a whole column of normalized UPC-A (12) / EAN-13 codes:
+    UPC_OK, UPC_BAD_CHECK, UPC_MALFORMED or UPC_MISSING per value.
+    """
+    codes = pd.Series(values, dtype=object).fillna("").astype(str)
+    status = np.full(len(codes), UPC_MALFORMED, dtype=object)
+    status[(codes == "").to_numpy()] = UPC_MISSING
+
+    shaped = codes.str.fullmatch(r"\d{12,13}").to_numpy()
+    if shaped.any():
+        # UPC-A is EAN-13 with a leading 0; weights 1,3,1,3... over the first 12 digits
+        ean = codes[shaped].str.zfill(13)
+        digits = np.frombuffer("".join(ean).encode("ascii"), dtype=np.uint8).reshape(-1, 13) - 48
+        weights = np.tile([1, 3], 6)
+        expected = (10 - (digits[:, :12] @ weights) % 10) % 10
+        status[shaped] = np.where(expected == digits[:, 12], UPC_OK, UPC_BAD_CHECK)
+    return status
+
+
+def barcode_report(frames):
+    """
+    Check-digit status counts over the Barcode column of finalized order frames, and the
+    lines that aren't UPC_OK (style / color / size / inseam / barcode / status).
+    """
+    columns = ["STYLE NUMBER", "COLOR NO", "Size", "Inseam", "Barcode"]
+    lines = pd.concat([df for df in frames if not df.empty] or [pd.DataFrame(columns=columns)])
+    status = check_upc(lines["Barcode"].to_numpy())
+    problems = lines.loc[status != UPC_OK, columns]
+    return upc_summary(status), problems.assign(Status=status[status != UPC_OK]).drop_duplicates()
+
+
+def upc_summary(status):
+    """{status: count} for a check_upc result, only the statuses that occur."""
+    values, counts = np.unique(np.asarray(status, dtype=object).astype(str), return_counts=True)
+    return dict(zip(values.tolist(), counts.tolist()))
+
+
+def read_upc_bytes(data, file_name=""):
+    """Parse a UPC master upload (.xlsx through the column-pruned reader, or .csv as text)."""
+    if file_name.lower().endswith(".csv"):
+        return pd.read_csv(BytesIO(data), dtype=str, keep_default_na=False).rename(columns=str.strip)
+    wanted = [name for names in UPC_KEY_COLUMNS.values() for name in names] + VDATA_COLUMNS
+    return read_master_bytes(data, columns=wanted)
+
+
+def _find_column(df, names):
+    return next((name for name in names if name in df.columns), None)
+
+
+class UpcIndex:
+    """
+    Hash index of a UPC master: 'style|color|size|inseam' → UPC (and VDATA when the file
+    has it). Built once per upload; a lookup is one Index.get_indexer over the order lines.
+    When a key is listed more than once the first row wins.
+    """
+
+    def __init__(self, upc_df):
+        found = {key: _find_column(upc_df, names) for key, names in UPC_KEY_COLUMNS.items()}
+        missing = [UPC_KEY_COLUMNS[key][0] for key, col in found.items() if col is None]
+        if missing:
+            raise ValueError(f"UPC Master is missing column(s): {', '.join(missing)}")
+
+        keys = line_keys(*(upc_df[found[key]] for key in ("style", "color", "size", "inseam")))
+        first = ~pd.Index(keys).duplicated(keep="first")
+        self.index = pd.Index(keys[first])
+        self.upc = normalize_upc(upc_df[found["upc"]][first])
+        vdata_col = _find_column(upc_df, VDATA_COLUMNS)
+        self.vdata = None
+        if vdata_col:
+            vdata = upc_df[vdata_col].to_numpy(dtype=object)[first]
+            self.vdata = np.where(pd.isna(vdata), "", vdata).astype(object)
+
+        self.status = check_upc(self.upc)
+        self.duplicates = int((~first).sum())
+        self.index.get_indexer(self.index[:1])  # build the hash table now, not on the first lookup
+
+    def __len__(self):
+        return len(self.index)
+
+    def summary(self):
+        """Check-digit status counts over the whole UPC master, plus repeated keys."""
+        return {**upc_summary(self.status), "duplicate keys": self.duplicates}
+
+    def lookup(self, style, color, size, inseam):
+        """(Barcode, VDATA) arrays for order lines; "" where the key isn't in the master."""
+        positions = self.index.get_indexer(line_keys(style, color, size, inseam))
+        found = positions >= 0
+        barcode = np.full(len(positions), "", dtype=object)
+        barcode[found] = self.upc[positions[found]]
+        vdata = np.full(len(positions), "", dtype=object)
+        if self.vdata is not None:
+            vdata[found] = self.vdata[positions[found]]
+        return barcode, vdata